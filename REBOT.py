@@ -1,5 +1,4 @@
 import asyncio
-import re
 import csv
 import pdfplumber
 from playwright.async_api import async_playwright
@@ -10,83 +9,12 @@ from email.message import EmailMessage
 from datetime import datetime
 from collections import defaultdict
 
+from bank_config import load_plan
+from result_sink import ResultSink
+
 # === CONFIGURATION ===
-# Unified regex with named group 'rate' for consistent extraction
-BANKS = [
-    {
-        "name": "Truist",
-        "url": "https://www.truist.com/mortgage/current-mortgage-rates",
-        "page": 0,
-        "combinations": [
-            ("Purchase", "dynamic-rates-input-1__mortgage-rates-354528076", "1pt"),
-            ("Purchase", "dynamic-rates-input-2__mortgage-rates-354528076", "0pt"),
-            ("Refinance", "dynamic-rates-input-1__mortgage-rates-586732436", "1pt"),
-            ("Refinance", "dynamic-rates-input-2__mortgage-rates-586732436", "0pt"),
-        ],
-        "coordinates": {
-            "Purchase": {
-                "30-Year Fixed": (150.0, 415.0, 235.0, 585.0),
-                "15-Year Fixed": (260.0, 415.0, 335.0, 585.0),
-                "30-Year Jumbo": (365.0, 415.0, 440.0, 585.0),
-            },
-            "Refinance": {
-                "30-Year Fixed": (210.0, 410.0, 285.0, 580.0),
-                "15-Year Fixed": (315.0, 410.0, 385.0, 580.0),
-            }
-        },
-        "regex": r"(?P<rate>[\d]+(?:\.\d+)?%)",
-    },
-    {
-        "name": "Quicken Loans",
-        "url": "https://www.quickenloans.com/mortgage-rates",
-        "page": 0,
-        "combinations": [
-            ("General", "", "0pt"),
-        ],
-        "coordinates": {
-            "General": {
-                "30-Year Fixed": (30.0, 305.0, 425.0, 325.0),
-                "15-Year Fixed": (30.0, 335.0, 425.0, 355.0),
-            }
-        },
-        "regex": r"(?P<rate>[\d]+(?:\.\d+)?%)",
-    },
-    {
-        "name": "Vystar",
-        "url": "https://consumer.optimalblue.com/FeaturedRates?GUID=248df9c1-923d-4153-ab2d-050ba1bd6acf",
-        "page": 0,
-        "combinations": [
-            ("General", "", "0pt"),
-        ],
-        "coordinates": {
-            "General": {
-                "30-Year Fixed": (17.0, 84.0, 57.0, 100.0),
-                "15-Year Fixed": (19.0, 254.0, 55.0, 265.0),
-            }
-        },
-        "regex": r"(?P<rate>[\d]+(?:\.\d+)?%)",
-    },
-    {
-        "name": "Bankrate",
-        "url": "https://www.bankrate.com/mortgages/arm-loan-rates/?mortgageType=Purchase&partnerId=br3&pid=br3&pointsChanged=false&purchaseDownPayment=55680&purchaseLoanTerms=3-1arm%2C5-1arm%2C7-1arm%2C10-1arm&purchasePoints=All&purchasePrice=278400&purchasePropertyType=SingleFamily&purchasePropertyUse=PrimaryResidence&searchChanged=false&ttcid&userCreditScore=740&userDebtToIncomeRatio=0&userFha=false&userVeteranStatus=NoMilitaryService&zipCode=32669#todays-arm-rates",
-        "page": 3,
-        "combinations": [
-            ("Refinance", "refinance-1", "0pt"),
-            ("Purchase", "purchase-0", "0pt"),
-        ],
-        "coordinates": {
-            "Purchase": {
-                "30-Year Fixed": (350.0, 31.0, 390.0, 48.0),
-                "15-Year Fixed": (350.0, 68.0, 390.0, 85.0),
-            },
-            "Refinance": {
-                "30-Year Fixed": (350.0, 330.0, 387.0, 350.0),
-                "15-Year Fixed": (350.0, 365.0, 387.0, 385.0),
-            }
-        },
-        "regex": r"(?P<rate>[\d]+(?:\.\d+)?%)",
-    },    
-]
+# Bank definitions live in banks.json (see bank_config.py)
+BANKS = load_plan().banks
 
 async def capture_pdfs(bank):
     """
@@ -95,12 +23,12 @@ async def capture_pdfs(bank):
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=True)
         page = await browser.new_page()
-        print(f"\n🌐 Navigating to {bank['name']}...")
-        await page.goto(bank['url'], wait_until="networkidle")
+        print(f"\n🌐 Navigating to {bank.name}...")
+        await page.goto(bank.url, wait_until="networkidle")
         await asyncio.sleep(7)
 
-        for mode, toggle_id, point_label in bank['combinations']:
-            filename = f"{bank['name']}_{mode}_{point_label}.pdf"
+        for mode, toggle_id, point_label in bank.combinations:
+            filename = bank.pdf_path(mode, point_label)
 
             if toggle_id:
                 print(f"➡️ Switching to: {mode} - {point_label}")
@@ -124,27 +52,27 @@ async def capture_pdfs(bank):
             print(f"📄 Saved: {filename}")
 
         await browser.close()
-        print(f"✅ Finished capturing PDFs for {bank['name']}.")
+        print(f"✅ Finished capturing PDFs for {bank.name}.")
 
 
-def extract_rates(all_results):
+def extract_rates(all_results, banks=None):
     """
     Open each saved PDF, crop to the configured bounding boxes (if any), apply the unified regex,
     and append the structured data to all_results.
     """
-    for bank in BANKS:
-        pattern = re.compile(bank['regex'], re.IGNORECASE)
-        pagenumber = bank['page']
+    for bank in banks or BANKS:
+        pattern = bank.pattern
+        pagenumber = bank.page
 
-        for mode, _, point_label in bank['combinations']:
-            pdf_path = f"{bank['name']}_{mode}_{point_label}.pdf"
+        for mode, _, point_label in bank.combinations:
+            pdf_path = bank.pdf_path(mode, point_label)
             if not os.path.exists(pdf_path):
                 print(f"⚠️ Missing file: {pdf_path}")
                 continue
 
             with pdfplumber.open(pdf_path) as pdf:
                 page = pdf.pages[pagenumber]
-                boxes = bank['coordinates'].get(mode)
+                boxes = bank.boxes.get(mode)
 
                 if boxes:
                     # Use the defined bounding boxes for this mode
@@ -153,7 +81,7 @@ def extract_rates(all_results):
                         match = pattern.search(cropped_text)
                         rate = match.group('rate') if match else "N/A"
                         all_results.append({
-                            'Bank': bank['name'],
+                            'Bank': bank.name,
                             'Purpose': mode,
                             'Points': point_label,
                             'Loan Type': loan_type,
@@ -165,7 +93,7 @@ def extract_rates(all_results):
                     for m in pattern.finditer(full_text):
                         rate = m.group('rate')
                         all_results.append({
-                            'Bank': bank['name'],
+                            'Bank': bank.name,
                             'Purpose': mode,
                             'Points': point_label or "N/A",
                             'Loan Type': 'N/A',
@@ -264,20 +192,17 @@ def send_email(html_content):
     send_email(html)
 
 async def main():
-    # 1) Download all PDFs
-    for bank in BANKS:
-        await capture_pdfs(bank)
+    with ResultSink() as sink:
+        for bank in BANKS:
+            # 1) Download this bank's PDFs
+            await capture_pdfs(bank)
 
-    # 2) Extract rates from every PDF exactly once
-    all_data = []
-    extract_rates(all_data)
+            # 2) Extract its rates and stream them to the run log / partial CSV
+            extract_rates(sink, [bank])
+            sink.flush()
 
-    # 3) Write results to CSV
-    output_file = 'all_cleaned_rates.csv'
-    with open(output_file, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=["Bank", "Purpose", "Points", "Loan Type", "Rate"])
-        writer.writeheader()
-        writer.writerows(all_data)
+        # 3) Atomically publish the final CSV
+        output_file = sink.publish()
 
     print(f"\n✅ All bank rates saved to {output_file}")
 
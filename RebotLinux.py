@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 
 import asyncio
-import re
 import csv
 import fitz           # PyMuPDF
 from playwright.async_api import async_playwright
@@ -12,6 +11,9 @@ from email.message import EmailMessage
 from datetime import datetime
 from collections import defaultdict
 
+from bank_config import load_plan
+from result_sink import ResultSink
+
 # Make the current working directory the script’s directory
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
@@ -31,92 +33,18 @@ company_colors = {
     "gray": "#555"
 }
 
-BANKS = [
-    {
-        "name": "Truist",
-        "url": "https://www.truist.com/mortgage/current-mortgage-rates",
-        "page": 0,
-        "combinations": [
-            ("Purchase", "dynamic-rates-input-1__mortgage-rates-354528076", "1pt"),
-            ("Purchase", "dynamic-rates-input-2__mortgage-rates-354528076", "0pt"),
-            ("Refinance", "dynamic-rates-input-1__mortgage-rates-586732436", "1pt"),
-            ("Refinance", "dynamic-rates-input-2__mortgage-rates-586732436", "0pt"),
-        ],
-        "coordinates": {
-            "Purchase": {
-                "30-Year Fixed": (150.0, 415.0, 235.0, 585.0),
-                "15-Year Fixed": (260.0, 415.0, 335.0, 585.0),
-                "30-Year Jumbo": (365.0, 415.0, 440.0, 585.0),
-            },
-            "Refinance": {
-                "30-Year Fixed": (210.0, 410.0, 285.0, 580.0),
-                "15-Year Fixed": (315.0, 410.0, 385.0, 580.0),
-            }
-        },
-        "regex": r"(?P<rate>[\d]+(?:\.\d+)?%)",
-    },
-    {
-        "name": "Quicken Loans",
-        "url": "https://www.quickenloans.com/mortgage-rates",
-        "page": 0,
-        "combinations": [
-            ("General", "", "0pt"),
-        ],
-        "coordinates": {
-            "General": {
-                "30-Year Fixed": (30.0, 305.0, 425.0, 325.0),
-                "15-Year Fixed": (30.0, 335.0, 425.0, 355.0),
-            }
-        },
-        "regex": r"(?P<rate>[\d]+(?:\.\d+)?%)",
-    },
-    {
-        "name": "Vystar",
-        "url": "https://consumer.optimalblue.com/FeaturedRates?GUID=248df9c1-923d-4153-ab2d-050ba1bd6acf",
-        "page": 0,
-        "combinations": [
-            ("General", "", "0pt"),
-        ],
-        "coordinates": {
-            "General": {
-                "30-Year Fixed": (17.0, 84.0, 57.0, 100.0),
-                "15-Year Fixed": (17.0, 250.0, 57.0, 267.0),
-            }
-        },
-        "regex": r"(?P<rate>[\d]+(?:\.\d+)?%)",
-    },
-    {
-        "name": "Bankrate",
-        "url": "https://www.bankrate.com/mortgages/arm-loan-rates/?mortgageType=Purchase&partnerId=br3&pid=br3&pointsChanged=false&purchaseDownPayment=55680&purchaseLoanTerms=3-1arm%2C5-1arm%2C7-1arm%2C10-1arm&purchasePoints=All&purchasePrice=278400&purchasePropertyType=SingleFamily&purchasePropertyUse=PrimaryResidence&searchChanged=false&ttcid&userCreditScore=740&userDebtToIncomeRatio=0&userFha=false&userVeteranStatus=NoMilitaryService&zipCode=32669#todays-arm-rates",
-        "page": 3,
-        "combinations": [
-            ("Refinance", "refinance-1", "0pt"),
-            ("Purchase", "purchase-0", "0pt"),
-        ],
-        "coordinates": {
-            "Purchase": {
-                "30-Year Fixed": (348.0, 31.0, 390.0, 48.0),
-                "15-Year Fixed": (350.0, 68.0, 390.0, 85.0),
-            },
-            "Refinance": {
-                "30-Year Fixed": (350.0, 330.0, 387.0, 350.0),
-                "15-Year Fixed": (350.0, 365.0, 387.0, 385.0),
-            }
-        },
-        "regex": r"(?P<rate>[\d]+(?:\.\d+)?%)",
-    },
-]
+BANKS = load_plan().banks
 
 async def capture_pdfs(bank):
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=True)
         page = await browser.new_page()
-        print(f"\n🌐 Navigating to {bank['name']}...")
-        await page.goto(bank['url'], wait_until="networkidle")
+        print(f"\n🌐 Navigating to {bank.name}...")
+        await page.goto(bank.url, wait_until="networkidle")
         await asyncio.sleep(5)
 
-        for mode, toggle_id, point_label in bank['combinations']:
-            filename = f"{bank['name']}_{mode}_{point_label}.pdf"
+        for mode, toggle_id, point_label in bank.combinations:
+            filename = bank.pdf_path(mode, point_label)
             if toggle_id:
                 print(f"➡️ Switching to {mode} ({point_label})")
                 await page.evaluate(f"""
@@ -132,22 +60,22 @@ async def capture_pdfs(bank):
             print(f"📄 Saved {filename}")
 
         await browser.close()
-        print(f"✅ Completed PDFs for {bank['name']}")
+        print(f"✅ Completed PDFs for {bank.name}")
 
-def extract_rates(all_results):
-    for bank in BANKS:
-        pat = re.compile(bank['regex'], re.IGNORECASE)
-        for mode, _, point_label in bank['combinations']:
-            pdf_f = f"{bank['name']}_{mode}_{point_label}.pdf"
+def extract_rates(all_results, banks=None):
+    for bank in banks or BANKS:
+        pat = bank.pattern
+        for mode, _, point_label in bank.combinations:
+            pdf_f = bank.pdf_path(mode, point_label)
             if not os.path.exists(pdf_f):
                 print(f"⚠️ Missing {pdf_f}")
                 continue
 
             # --- Open with PyMuPDF ---
             doc = fitz.open(pdf_f)
-            page = doc[bank['page']]
+            page = doc[bank.page]
 
-            boxes = bank['coordinates'].get(mode, {})
+            boxes = bank.boxes.get(mode, {})
             if boxes:
                 for loan, bbox in boxes.items():
                     # bbox is (x0, y0, x1, y1)
@@ -156,7 +84,7 @@ def extract_rates(all_results):
                     m = pat.search(text)
                     rate = m.group('rate') if m else 'N/A'
                     all_results.append({
-                        'Bank': bank['name'],
+                        'Bank': bank.name,
                         'Purpose': mode,
                         'Points': point_label,
                         'Loan Type': loan,
@@ -167,7 +95,7 @@ def extract_rates(all_results):
                 text = page.get_text("text")
                 for m in pat.finditer(text):
                     all_results.append({
-                        'Bank': bank['name'],
+                        'Bank': bank.name,
                         'Purpose': mode,
                         'Points': point_label or 'N/A',
                         'Loan Type': 'N/A',
@@ -228,18 +156,15 @@ def send_email(html):
     print(f"📧 Email sent to {tos}")
 
 async def main():
-    # 1) Capture PDFs
-    for bank in BANKS:
-        await capture_pdfs(bank)
-
-    # 2) Extract and save CSV
-    data = []
-    extract_rates(data)
-    out = 'all_cleaned_rates.csv'
-    with open(out,'w',newline='',encoding='utf-8') as f:
-        w = csv.DictWriter(f, fieldnames=['Bank','Purpose','Points','Loan Type','Rate'])
-        w.writeheader()
-        w.writerows(data)
+    # 1) Capture PDFs, streaming each bank's rates out as soon as it's done
+    with ResultSink() as sink:
+        for bank in BANKS:
+            await capture_pdfs(bank)
+            extract_rates(sink, [bank])
+            sink.flush()
+
+        # 2) Publish the CSV snapshot
+        out = sink.publish()
     print(f"✅ Saved CSV to {out}")
 
     # 3) Load CSV and send email
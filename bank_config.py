@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+bank_config.py
+
+Single source of truth for bank definitions.
+
+banks.json is validated once and compiled into an immutable Plan: regexes are
+precompiled, bboxes become BBox tuples (usable directly by pdfplumber's
+within_bbox() and fitz.Rect()), and each bank carries its page index and
+readiness spec (how long to let the page settle after navigation and toggles).
+
+A bank may also template its URL and form inputs with {placeholders}; the
+"params" object holds the default scenario and sweep.py expands them over a
+parameter matrix. A templated bank gives "url_template" instead of "url",
+and its url is the template filled with the defaults.
+
+Banks whose rates are in static HTML or a JSON endpoint can add an "http"
+spec (see fast_path.py); it is only allowed for banks without toggles, since
+a plain fetch sees a single view of the page.
+
+Long-running processes use PlanWatcher, which recompiles the plan when the
+file changes and keeps the last good plan if the new file does not validate.
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+import string
+import tempfile
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_FILE = os.environ.get("REBOT_BANKS_CONFIG", os.path.join(BASE_DIR, "banks.json"))
+LAST_GOOD_FILE = os.path.join(BASE_DIR, "banks.last_good.json")
+DEFAULT_TTL = 3600.0     # seconds a bank's rates stay fresh in rate_service.py
+
+
+class ConfigError(ValueError):
+    """Raised when banks.json does not describe a valid plan."""
+
+
+class BBox(NamedTuple):
+    x0: float
+    top: float
+    x1: float
+    bottom: float
+
+
+class Combination(NamedTuple):
+    mode: str
+    toggle_id: str
+    point_label: str
+
+
+@dataclass(frozen=True)
+class Readiness:
+    wait_until: str = "networkidle"
+    settle: float = 5.0          # seconds after navigation
+    tab_settle: float = 2.0      # seconds after clicking a mode tab
+    toggle_settle: float = 5.0   # seconds after clicking a points toggle
+    selector: Optional[str] = None   # optional element to wait for before settling
+
+
+@dataclass(frozen=True)
+class HttpSpec:
+    url: Optional[str]                       # defaults to the bank's (templated) URL
+    format: str                              # "html" or "json"
+    labels: Mapping[str, re.Pattern]         # loan type -> pattern with a 'rate' group (html)
+    paths: Mapping[str, Tuple[str, ...]]     # loan type -> key path into the document (json)
+
+
+@dataclass(frozen=True)
+class BankPlan:
+    name: str
+    url: str
+    page: int
+    combinations: Tuple[Combination, ...]
+    boxes: Mapping[str, Mapping[str, BBox]]
+    pattern: re.Pattern
+    readiness: Readiness
+    consent: Optional[str] = None
+    url_template: Optional[str] = None
+    form: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    params: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    http: Optional[HttpSpec] = None
+    ttl: float = DEFAULT_TTL
+    probe: Optional[str] = None              # cheap URL whose changes track the rates; enables reuse
+
+    def pdf_path(self, mode, point_label):
+        return f"{self.name}_{mode}_{point_label}.pdf"
+
+    def scenario(self, overrides=None):
+        """Default params merged with a sweep scenario's overrides."""
+        return {**self.params, **{k: str(v) for k, v in (overrides or {}).items()}}
+
+    def url_for(self, params=None):
+        if not self.url_template:
+            return self.url
+        return self.url_template.format_map(self.scenario(params))
+
+    def form_for(self, params=None):
+        """Selector -> value for every templated form input."""
+        values = self.scenario(params)
+        return {sel: tpl.format_map(values) for sel, tpl in self.form.items()}
+
+
+@dataclass(frozen=True)
+class Plan:
+    banks: Tuple[BankPlan, ...]
+    source: str
+    mtime: float
+
+    def bank(self, name):
+        for b in self.banks:
+            if b.name == name:
+                return b
+        raise KeyError(name)
+
+
+WAIT_UNTIL = ("load", "domcontentloaded", "networkidle", "commit")
+
+
+def _fields(template):
+    """Named {placeholders} of a template; positional ones ({} or {0}) are a ValueError."""
+    names = {name for _, name, _, _ in string.Formatter().parse(template) if name is not None}
+    if any(not n or n[0].isdigit() for n in names):
+        raise ValueError("placeholders must be named, e.g. {zip_code}")
+    return names
+
+
+def default_label_pattern(loan, rate_pattern):
+    """'30-Year Fixed' followed, within a short span, by the bank's rate regex."""
+    words = [re.escape(w) for w in re.findall(r"[A-Za-z0-9]+", loan)]
+    label = r"[\s\-]*".join(words)
+    return re.compile(label + r"\b.{0,200}?" + rate_pattern.pattern, re.IGNORECASE | re.DOTALL)
+
+
+def _compile_http(raw, where, combos, boxes, pattern):
+    if raw is None:
+        return None
+    if not isinstance(raw, dict):
+        raise ConfigError(f"{where}: 'http' must be an object")
+    if any(c.toggle_id for c in combos):
+        raise ConfigError(f"{where}: 'http' fast path needs a bank without toggles")
+    url = raw.get("url")
+    if url is not None and not isinstance(url, str):
+        raise ConfigError(f"{where}: http 'url' must be a string")
+    fmt = raw.get("format", "html")
+    if fmt not in ("html", "json"):
+        raise ConfigError(f"{where}: http 'format' must be 'html' or 'json'")
+    loans = list(dict.fromkeys(loan for mode_boxes in boxes.values() for loan in mode_boxes))
+
+    labels, paths = {}, {}
+    if fmt == "html":
+        custom = raw.get("labels", {})
+        if not isinstance(custom, dict) or not all(isinstance(v, str) for v in custom.values()):
+            raise ConfigError(f"{where}: http 'labels' must map loan types to regex strings")
+        for loan in loans:
+            try:
+                labels[loan] = (re.compile(custom[loan], re.IGNORECASE | re.DOTALL)
+                                if loan in custom else default_label_pattern(loan, pattern))
+            except re.error as e:
+                raise ConfigError(f"{where}: bad http label for {loan}: {e}") from None
+            if "rate" not in labels[loan].groupindex:
+                raise ConfigError(f"{where}: http label for {loan} needs a 'rate' group")
+    else:
+        key_paths = raw.get("paths", {})
+        if not isinstance(key_paths, dict):
+            raise ConfigError(f"{where}: http 'paths' must be an object")
+        for loan in loans:
+            path = key_paths.get(loan)
+            if not isinstance(path, str) or not path:
+                raise ConfigError(f"{where}: http 'paths' needs a key path for {loan}")
+            paths[loan] = tuple(path.split("."))
+
+    return HttpSpec(url=url, format=fmt,
+                    labels=MappingProxyType(labels), paths=MappingProxyType(paths))
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _require(raw, key, kind, where):
+    if key not in raw:
+        raise ConfigError(f"{where}: missing '{key}'")
+    value = raw[key]
+    if not isinstance(value, kind) or isinstance(value, bool):
+        raise ConfigError(f"{where}: '{key}' must be {getattr(kind, '__name__', kind)}")
+    return value
+
+
+def compile_bank(raw, index=0):
+    """Validate one bank entry and compile it into a BankPlan."""
+    where = f"banks[{index}]"
+    if not isinstance(raw, dict):
+        raise ConfigError(f"{where}: expected an object")
+    name = _require(raw, "name", str, where)
+    where = f"bank '{name}'"
+    if "url_template" in raw:
+        if "url" in raw:
+            raise ConfigError(f"{where}: give either 'url' or 'url_template', not both")
+        url = None
+    else:
+        url = _require(raw, "url", str, where)
+    page = _require(raw, "page", int, where)
+    if page < 0:
+        raise ConfigError(f"{where}: 'page' must be >= 0")
+
+    combos = []
+    for combo in _require(raw, "combinations", list, where):
+        if (not isinstance(combo, list) or len(combo) != 3
+                or not all(isinstance(v, str) for v in combo)):
+            raise ConfigError(f"{where}: combination {combo!r} must be [mode, toggle_id, points]")
+        combos.append(Combination(*combo))
+    if not combos:
+        raise ConfigError(f"{where}: no combinations")
+
+    modes = {c.mode for c in combos}
+    boxes = {}
+    for mode, loans in _require(raw, "coordinates", dict, where).items():
+        if mode not in modes:
+            raise ConfigError(f"{where}: coordinates for unknown mode '{mode}'")
+        if not isinstance(loans, dict):
+            raise ConfigError(f"{where}: coordinates for '{mode}' must map loan types to bboxes")
+        compiled = {}
+        for loan, bbox in loans.items():
+            if (not isinstance(bbox, list) or len(bbox) != 4
+                    or not all(_is_number(v) for v in bbox)):
+                raise ConfigError(f"{where}: bbox for {mode}/{loan} must be 4 numbers")
+            box = BBox(*(float(v) for v in bbox))
+            if box.x0 >= box.x1 or box.top >= box.bottom:
+                raise ConfigError(f"{where}: bbox for {mode}/{loan} is empty: {bbox}")
+            compiled[loan] = box
+        boxes[mode] = MappingProxyType(compiled)
+
+    try:
+        pattern = re.compile(_require(raw, "regex", str, where), re.IGNORECASE)
+    except re.error as e:
+        raise ConfigError(f"{where}: bad regex: {e}") from None
+    if "rate" not in pattern.groupindex:
+        raise ConfigError(f"{where}: regex needs a named group 'rate'")
+
+    ready = raw.get("ready", {})
+    if not isinstance(ready, dict):
+        raise ConfigError(f"{where}: 'ready' must be an object")
+    try:
+        readiness = Readiness(**ready)
+    except TypeError as e:
+        raise ConfigError(f"{where}: bad 'ready' spec: {e}") from None
+    if readiness.wait_until not in WAIT_UNTIL:
+        raise ConfigError(f"{where}: 'ready.wait_until' must be one of {', '.join(WAIT_UNTIL)}")
+    for key in ("settle", "tab_settle", "toggle_settle"):
+        value = getattr(readiness, key)
+        if not _is_number(value) or value < 0:
+            raise ConfigError(f"{where}: 'ready.{key}' must be a number of seconds >= 0")
+    if readiness.selector is not None and not isinstance(readiness.selector, str):
+        raise ConfigError(f"{where}: 'ready.selector' must be a string")
+
+    consent = raw.get("consent")
+    if consent is not None and not isinstance(consent, str):
+        raise ConfigError(f"{where}: 'consent' must be a selector string")
+
+    ttl = raw.get("ttl", DEFAULT_TTL)
+    if not _is_number(ttl) or ttl <= 0:
+        raise ConfigError(f"{where}: 'ttl' must be a positive number of seconds")
+
+    probe = raw.get("probe")
+    if probe is not None and not isinstance(probe, str):
+        raise ConfigError(f"{where}: 'probe' must be a URL string")
+
+    params = raw.get("params", {})
+    form = raw.get("form", {})
+    url_template = raw.get("url_template")
+    if not isinstance(params, dict) or not isinstance(form, dict):
+        raise ConfigError(f"{where}: 'params' and 'form' must be objects")
+    if not all(isinstance(v, (str, int, float)) and not isinstance(v, bool) for v in params.values()):
+        raise ConfigError(f"{where}: 'params' values must be strings or numbers")
+    templates = list(form.values()) + ([url_template] if url_template else [])
+    for tpl in templates:
+        if not isinstance(tpl, str):
+            raise ConfigError(f"{where}: templates must be strings")
+        try:
+            missing = _fields(tpl) - set(params)
+        except ValueError as e:
+            raise ConfigError(f"{where}: bad template {tpl!r}: {e}") from None
+        if missing:
+            raise ConfigError(f"{where}: no default in 'params' for {sorted(missing)}")
+    params = {k: str(v) for k, v in params.items()}
+    if url is None:
+        try:
+            url = url_template.format_map(params)
+        except (ValueError, KeyError, IndexError) as e:
+            raise ConfigError(f"{where}: bad url_template: {e}") from None
+
+    return BankPlan(
+        name=name,
+        url=url,
+        page=page,
+        combinations=tuple(combos),
+        boxes=MappingProxyType(boxes),
+        pattern=pattern,
+        readiness=readiness,
+        consent=consent,
+        url_template=url_template,
+        form=MappingProxyType(dict(form)),
+        params=MappingProxyType(params),
+        http=_compile_http(raw.get("http"), where, combos, boxes, pattern),
+        ttl=float(ttl),
+        probe=probe,
+    )
+
+
+def load_plan(path=CONFIG_FILE):
+    """Read, validate and compile banks.json into a Plan."""
+    mtime = os.path.getmtime(path)
+    try:
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+    except json.JSONDecodeError as e:
+        raise ConfigError(f"{path}: {e}") from None
+    if not isinstance(raw, dict):
+        raise ConfigError(f"{path}: expected an object with a 'banks' list")
+
+    banks = tuple(compile_bank(b, i) for i, b in enumerate(_require(raw, "banks", list, path)))
+    names = [b.name for b in banks]
+    dupes = {n for n in names if names.count(n) > 1}
+    if dupes:
+        raise ConfigError(f"{path}: duplicate bank names {sorted(dupes)}")
+    return Plan(banks=banks, source=path, mtime=mtime)
+
+
+def save_last_good(path, target=LAST_GOOD_FILE):
+    """
+    Copy a validated config to LAST_GOOD_FILE atomically: several watchers
+    (scheduler, worker, rate_service) write it, and child processes read it.
+    """
+    if os.path.exists(target) and os.path.samefile(path, target):
+        return
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(target) + ".", suffix=".partial",
+                               dir=os.path.dirname(os.path.abspath(target)))
+    try:
+        with os.fdopen(fd, "wb") as out, open(path, "rb") as src:
+            shutil.copyfileobj(src, out)
+        os.replace(tmp, target)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class PlanWatcher:
+    """
+    Hold the current Plan and recompile it when the config file changes.
+    A config that fails validation is logged and ignored; the last good plan
+    stays in use and is kept on disk at LAST_GOOD_FILE.
+    """
+
+    def __init__(self, path=CONFIG_FILE, interval=1.0):
+        self.path = path
+        self.interval = interval
+        self._checked = 0.0
+        self.plan = load_plan(path)
+        save_last_good(path)
+
+    def current(self):
+        now = time.monotonic()
+        if now - self._checked >= self.interval:
+            self._checked = now
+            self._reload_if_changed()
+        return self.plan
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self.plan.mtime:
+            return
+        try:
+            plan = load_plan(self.path)
+        except OSError as e:
+            # e.g. the file is briefly missing during an editor's atomic save; retry next tick
+            logging.warning(f"Couldn't read bank config, will retry: {e}")
+            return
+        except Exception as e:
+            # ConfigError, or anything validation missed: never take the caller down
+            logging.error(f"Ignoring invalid bank config: {e}")
+            # Don't retry the same broken file every tick
+            self.plan = Plan(self.plan.banks, self.plan.source, mtime)
+            return
+        self.plan = plan
+        save_last_good(self.path)
+        logging.info(f"Reloaded bank plan from {self.path} ({len(plan.banks)} banks)")
+
+    @property
+    def last_good_path(self):
+        return LAST_GOOD_FILE
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+calibrate.py
+
+Headless bounding-box calibration for every PDF referenced by banks.json.
+
+Each captured PDF is opened once and its words indexed. For every configured
+loan type the label (e.g. "30-Year Fixed") is located on the page and the
+closest rate to its right or below it becomes the proposed bbox. The tool
+writes, per PDF, a word dump and an overlay PNG (current box red, proposed
+box green) into OUT_DIR, then prints a diff of the `coordinates` config.
+
+Usage:
+    python3 calibrate.py [--bank NAME] [--all] [--out DIR]
+"""
+
+import argparse
+import difflib
+import json
+import os
+import re
+
+import pdfplumber
+
+from bank_config import BASE_DIR, load_plan
+
+OUT_DIR = "calibration"
+PAD = 3.0           # points added around a proposed rate word
+MAX_LABEL_WORDS = 5
+
+
+def norm(text):
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+
+def index_pdf(pdf_path, page_number):
+    """Open a PDF once and return (pdf, page, words) for the configured page."""
+    pdf = pdfplumber.open(pdf_path)
+    page = pdf.pages[page_number]
+    return pdf, page, page.extract_words()
+
+
+def write_words(words, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for word in words:
+            f.write(f"{word['text']:>20}  -->  "
+                    f"x0: {word['x0']:.2f}, top: {word['top']:.2f}, "
+                    f"x1: {word['x1']:.2f}, bottom: {word['bottom']:.2f}\n")
+
+
+def find_labels(words, label):
+    """Return bboxes of runs of consecutive words spelling out the label."""
+    target = norm(label)
+    hits = []
+    for i in range(len(words)):
+        text = ""
+        for j in range(i, min(i + MAX_LABEL_WORDS, len(words))):
+            text += norm(words[j]['text'])
+            if text == target:
+                run = words[i:j + 1]
+                hits.append((min(w['x0'] for w in run), min(w['top'] for w in run),
+                             max(w['x1'] for w in run), max(w['bottom'] for w in run)))
+                break
+            if not target.startswith(text):
+                break
+    return hits
+
+
+def nearest_rate(label_box, rate_words):
+    """Pick the rate word closest to the right of, or below, a label."""
+    lx0, ltop, lx1, lbottom = label_box
+    best, best_dist = None, None
+    for w in rate_words:
+        same_row = w['top'] < lbottom and w['bottom'] > ltop
+        if same_row and w['x0'] >= lx0:
+            dist = w['x0'] - lx1
+        elif w['top'] >= ltop:
+            dist = w['top'] - lbottom + abs(w['x0'] - lx0)
+        else:
+            continue
+        if best_dist is None or dist < best_dist:
+            best, best_dist = w, dist
+    return best
+
+
+def propose_box(words, loan, pattern):
+    rate_words = [w for w in words if pattern.search(w['text'])]
+    for label_box in find_labels(words, loan):
+        w = nearest_rate(label_box, rate_words)
+        if w:
+            return (round(w['x0'] - PAD), round(w['top'] - PAD),
+                    round(w['x1'] + PAD), round(w['bottom'] + PAD))
+    return None
+
+
+def box_rate(page, bbox, pattern):
+    text = page.within_bbox(bbox).extract_text() or ""
+    m = pattern.search(text)
+    return m.group('rate') if m else None
+
+
+def save_overlay(page, current, proposed, path):
+    im = page.to_image(resolution=100)
+    for bbox in current:
+        im.draw_rect(bbox, fill=None, stroke="red", stroke_width=2)
+    for bbox in proposed:
+        im.draw_rect(bbox, fill=None, stroke="green", stroke_width=2)
+    im.save(path, format="PNG")
+
+
+def format_coordinates(coords, indent=6):
+    """A bank's "coordinates" block laid out exactly as in banks.json, ready to paste."""
+    pad = " " * indent
+    modes = list(coords.items())
+    lines = [f'{pad}"coordinates": {{\n']
+    for i, (mode, boxes) in enumerate(modes):
+        lines.append(f'{pad}  {json.dumps(mode)}: {{\n')
+        items = list(boxes.items())
+        for j, (loan, bbox) in enumerate(items):
+            values = ", ".join(f"{v:.1f}" for v in bbox)
+            comma = "," if j < len(items) - 1 else ""
+            lines.append(f'{pad}    {json.dumps(loan)}: [{values}]{comma}\n')
+        lines.append(f'{pad}  }}{"," if i < len(modes) - 1 else ""}\n')
+    lines.append(f"{pad}}},\n")
+    return lines
+
+
+def calibrate_bank(bank, out_dir, include_all):
+    """Index every PDF of a bank once and return (current, proposed) coordinates."""
+    pattern = bank.pattern
+    current = bank.boxes
+    proposed = {mode: dict(boxes) for mode, boxes in current.items()}
+    settled = set()
+
+    for mode, _, point_label in bank.combinations:
+        pdf_f = bank.pdf_path(mode, point_label)
+        if not os.path.exists(pdf_f):
+            print(f"⚠️ Missing {pdf_f}")
+            continue
+
+        pdf, page, words = index_pdf(pdf_f, bank.page)
+        stem = os.path.splitext(os.path.basename(pdf_f))[0]
+        write_words(words, os.path.join(out_dir, f"{stem}_words.txt"))
+
+        shown_current, shown_proposed = [], []
+        for loan, bbox in current.get(mode, {}).items():
+            shown_current.append(bbox)
+            rate = box_rate(page, bbox, pattern)
+            guess = propose_box(words, loan, pattern)
+            status = f"{rate}" if rate else "no match"
+            print(f"   {mode:<10} {point_label:<4} {loan:<15} current: {status:<9} "
+                  f"proposed: {guess or '—'}")
+            if guess:
+                shown_proposed.append(guess)
+            if (mode, loan) in settled or not guess:
+                continue
+            if include_all or not rate:
+                proposed[mode][loan] = tuple(float(v) for v in guess)
+                settled.add((mode, loan))
+
+        save_overlay(page, shown_current, shown_proposed,
+                     os.path.join(out_dir, f"{stem}.png"))
+        pdf.close()
+
+    return current, proposed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Propose rate bboxes for every bank PDF.")
+    parser.add_argument("--bank", help="only calibrate this bank")
+    parser.add_argument("--all", action="store_true",
+                        help="propose new boxes even where the current box still matches")
+    parser.add_argument("--out", default=OUT_DIR, help="directory for overlays and word dumps")
+    args = parser.parse_args()
+
+    os.chdir(BASE_DIR)
+    os.makedirs(args.out, exist_ok=True)
+    diff = []
+    for bank in load_plan().banks:
+        if args.bank and bank.name != args.bank:
+            continue
+        print(f"\n🔎 {bank.name}")
+        current, proposed = calibrate_bank(bank, args.out, args.all)
+        diff.extend(difflib.unified_diff(
+            format_coordinates(current), format_coordinates(proposed),
+            fromfile=f"{bank.name} (current)", tofile=f"{bank.name} (proposed)"))
+
+    print()
+    if diff:
+        print("".join(diff))
+        with open(os.path.join(args.out, "coordinates.diff"), "w", encoding="utf-8") as f:
+            f.writelines(diff)
+    else:
+        print("✅ All configured boxes still match; no changes proposed")
+    print(f"🖼️ Overlays and word dumps written to {args.out}/")
+    print("✏️ Paste accepted \"coordinates\" blocks over the bank's block in banks.json")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+capture_engine.py
+
+Browser side of the pipeline: open each bank's rate page, toggle the proper
+tabs/points and save every view as a PDF.
+
+Every bank gets its own persistent Chromium profile under PROFILE_ROOT, so
+cookies, localStorage (consent banners) and the on-disk HTTP cache survive
+between runs. Profiles are capped in size and their caches pruned
+periodically; the cache-hit ratio of each capture is printed and kept in
+CACHE_STATS_FILE.
+
+HAR mode bypasses the profiles and uses a fresh context per bank: "record"
+saves all of the bank's traffic to HAR_DIR/<bank>.har, "replay" serves every
+request from that file and aborts anything not in it, so a replayed capture
+does no network I/O and runs with shortened settle delays. Callers put replay
+output in its own directory (out_dir) so it never lands on the live PDFs.
+
+A capture holds a per-bank file lock under LOCK_DIR for its whole run, so
+two processes (the scheduled pipeline and rate_service.py) never drive the
+same bank at once; wait_for_lock=False fails fast with CaptureBusy instead.
+"""
+
+import asyncio
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import replace
+from datetime import datetime
+from pathlib import Path
+
+from playwright.async_api import async_playwright
+
+try:
+    import fcntl
+except ImportError:        # Windows
+    fcntl = None
+    import msvcrt
+
+# --- Profile / cache settings ---
+PROFILE_ROOT = Path("browser_profiles")
+DISK_CACHE_BYTES = 64 * 1024 * 1024        # Chromium --disk-cache-size per bank
+PROFILE_MAX_BYTES = 256 * 1024 * 1024      # prune caches when a profile grows past this
+PRUNE_INTERVAL_DAYS = 7                    # ...or when the last prune is older than this
+CACHE_STATS_FILE = "cache_stats.json"
+_CACHE_STATS_LOCK = threading.Lock()       # captures in threads (rate_service.py) share the file
+
+# --- HAR record/replay ---
+HAR_DIR = Path("har")
+REPLAY_SETTLE_SECONDS = 0.5                # cap on every settle delay when replaying
+
+# --- Cross-process capture locks ---
+LOCK_DIR = Path("capture_locks")
+
+# Cache folders inside a Chromium profile. Cookies and Local Storage live
+# elsewhere, so wiping these never brings back a consent banner.
+CACHE_DIRS = [
+    "Default/Cache",
+    "Default/Code Cache",
+    "Default/Service Worker/CacheStorage",
+    "GrShaderCache",
+    "ShaderCache",
+]
+PRUNE_MARKER = ".last_prune"
+
+
+def bank_slug(bank):
+    return re.sub(r"[^A-Za-z0-9]+", "_", bank.name).strip("_").lower()
+
+
+def profile_dir(bank, root=PROFILE_ROOT):
+    """Return the persistent profile directory for a bank."""
+    return Path(root) / bank_slug(bank)
+
+
+class CaptureBusy(RuntimeError):
+    """Another process is already capturing this bank."""
+
+
+@contextmanager
+def capture_lock(bank, wait=True):
+    """Exclusive per-bank lock shared by every process using this directory."""
+    LOCK_DIR.mkdir(exist_ok=True)
+    with open(LOCK_DIR / f"{bank_slug(bank)}.lock", "a+") as f:
+        try:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if wait else msvcrt.LK_NBLCK, 1)
+        except OSError:
+            raise CaptureBusy(f"{bank.name} is already being captured by another process") from None
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def har_path(bank):
+    return HAR_DIR / f"{bank_slug(bank)}.har"
+
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def prune_profile(path):
+    """
+    Drop the HTTP/code caches of a profile when it is over PROFILE_MAX_BYTES or
+    has not been pruned for PRUNE_INTERVAL_DAYS. Cookies and localStorage stay.
+    """
+    if not path.exists():
+        return
+    marker = path / PRUNE_MARKER
+    last = marker.stat().st_mtime if marker.exists() else 0
+    too_old = time.time() - last > PRUNE_INTERVAL_DAYS * 86400
+    size = dir_size(path)
+    if size <= PROFILE_MAX_BYTES and not too_old:
+        return
+
+    for rel in CACHE_DIRS:
+        shutil.rmtree(path / rel, ignore_errors=True)
+    marker.touch()
+    print(f"🧹 Pruned caches in {path} ({size / 1_048_576:.1f} MB before)")
+
+
+def attach_cache_meter(context, page):
+    """
+    Count requests, cache hits and bytes on the wire for a page via CDP.
+    Returns (stats, start) where start() must be awaited before navigating.
+    """
+    stats = {"requests": 0, "cache_hits": 0, "bytes": 0}
+    cached = set()
+
+    def on_request(params):
+        stats["requests"] += 1
+
+    def on_served_from_cache(params):
+        cached.add(params["requestId"])
+
+    def on_response(params):
+        resp = params["response"]
+        if resp.get("fromDiskCache") or resp.get("fromPrefetchCache"):
+            cached.add(params["requestId"])
+
+    def on_finished(params):
+        stats["bytes"] += int(params.get("encodedDataLength", 0))
+        if params["requestId"] in cached:
+            stats["cache_hits"] += 1
+
+    async def start():
+        client = await context.new_cdp_session(page)
+        client.on("Network.requestWillBeSent", on_request)
+        client.on("Network.requestServedFromCache", on_served_from_cache)
+        client.on("Network.responseReceived", on_response)
+        client.on("Network.loadingFinished", on_finished)
+        await client.send("Network.enable")
+
+    return stats, start
+
+
+def report_cache_stats(bank, stats):
+    """Print the cache-hit ratio for a capture and record it per bank."""
+    ratio = stats["cache_hits"] / stats["requests"] if stats["requests"] else 0.0
+    print(f"📦 {bank.name}: {stats['cache_hits']}/{stats['requests']} requests "
+          f"from cache ({ratio:.0%}), {stats['bytes'] / 1024:.0f} KB transferred")
+
+    with _CACHE_STATS_LOCK:
+        try:
+            with open(CACHE_STATS_FILE, encoding='utf-8') as f:
+                history = json.load(f)
+        except (OSError, ValueError):
+            history = {}          # missing or unreadable stats never fail a capture
+        history[bank.name] = dict(stats, hit_ratio=round(ratio, 4),
+                                  at=datetime.now().isoformat(timespec='seconds'))
+        # Other processes may write too: each uses its own temp file, swapped in atomically
+        fd, tmp = tempfile.mkstemp(prefix=CACHE_STATS_FILE + ".", suffix=".partial",
+                                   dir=os.path.dirname(os.path.abspath(CACHE_STATS_FILE)))
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(history, f, indent=2)
+        os.replace(tmp, CACHE_STATS_FILE)
+
+
+async def open_bank_context(p, bank, profile_root=PROFILE_ROOT):
+    """Launch Chromium on the bank's persistent profile and return (context, page)."""
+    path = profile_dir(bank, profile_root)
+    prune_profile(path)
+    path.mkdir(parents=True, exist_ok=True)
+    context = await p.chromium.launch_persistent_context(
+        str(path),
+        headless=True,
+        args=[f"--disk-cache-size={DISK_CACHE_BYTES}"],
+    )
+    page = context.pages[0] if context.pages else await context.new_page()
+    return context, page
+
+
+async def open_har_context(p, bank, har_mode):
+    """
+    Launch a fresh context that records to, or replays from, the bank's HAR.
+    Replay aborts any request the HAR can't answer and stubs out websockets.
+    """
+    path = har_path(bank)
+    if har_mode == "replay" and not path.exists():
+        raise FileNotFoundError(f"No HAR recorded for {bank.name}: {path}")
+
+    browser = await p.chromium.launch(headless=True)
+    context = await browser.new_context(service_workers="block")
+    if har_mode == "record":
+        HAR_DIR.mkdir(exist_ok=True)
+        await context.route_from_har(str(path), update=True, update_content="embed")
+    else:
+        await context.route_from_har(str(path), not_found="abort")
+        # Handler never connects to the server, so sockets stay offline
+        await context.route_web_socket(re.compile(".*"), lambda ws: None)
+    page = await context.new_page()
+    return context, page
+
+
+def replay_readiness(bank):
+    """The bank with its settle delays capped for replay."""
+    r = bank.readiness
+    cap = REPLAY_SETTLE_SECONDS
+    return replace(bank, readiness=replace(
+        r,
+        wait_until="load",
+        settle=min(r.settle, cap),
+        tab_settle=min(r.tab_settle, cap),
+        toggle_settle=min(r.toggle_settle, cap),
+    ))
+
+
+async def accept_consent(page, bank):
+    """Click the bank's consent banner if one is configured and still shown."""
+    if not bank.consent:
+        return
+    try:
+        await page.click(bank.consent, timeout=3_000)
+        print("🍪 Accepted consent banner")
+    except Exception:
+        # Already accepted in this profile
+        pass
+
+
+async def load_bank_page(page, bank, params=None):
+    """Open the bank's page for a scenario, fill templated inputs and let it settle."""
+    ready = bank.readiness
+    await page.goto(bank.url_for(params), wait_until=ready.wait_until)
+    await accept_consent(page, bank)
+    for selector, value in bank.form_for(params).items():
+        await page.fill(selector, value)
+        await page.press(selector, "Enter")
+    if ready.selector:
+        await page.wait_for_selector(ready.selector)
+    await asyncio.sleep(ready.settle)
+
+
+async def apply_combination(page, bank, mode, toggle_id):
+    """Click the mode tab and points toggle for one combination."""
+    if not toggle_id:
+        return
+    ready = bank.readiness
+    await page.evaluate(f"""
+        [...document.querySelectorAll('a[role=tab]')]
+            .find(e => e.textContent.includes("{mode}"))
+            ?.click();
+    """)
+    await asyncio.sleep(ready.tab_settle)
+    await page.evaluate(f"document.getElementById('{toggle_id}')?.click();")
+    await asyncio.sleep(ready.toggle_settle)
+
+
+async def capture_pdfs(bank, har_mode=None, profiler=None, out_dir=None,
+                       profile_root=PROFILE_ROOT, wait_for_lock=True):
+    """
+    Navigate to the bank's rate page, toggle the proper tabs/points and save
+    each view as a PDF (in out_dir, default the working directory), reusing
+    the bank's persistent profile under profile_root. With har_mode "record"
+    or "replay" the page's traffic is saved to / served from HAR; with a
+    profiler, a Playwright trace and Chromium metrics are collected.
+    """
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with capture_lock(bank, wait_for_lock):
+        await _capture(bank, har_mode, profiler, out_dir, profile_root)
+
+
+async def _capture(bank, har_mode, profiler, out_dir, profile_root):
+    async with async_playwright() as p:
+        stats = None
+        if har_mode:
+            if har_mode == "replay":
+                bank = replay_readiness(bank)
+            context, page = await open_har_context(p, bank, har_mode)
+        else:
+            context, page = await open_bank_context(p, bank, profile_root)
+            stats, start_meter = attach_cache_meter(context, page)
+            await start_meter()
+        if profiler:
+            await profiler.start_chromium(bank, context, page)
+
+        print(f"\n🌐 Navigating to {bank.name}...")
+        await load_bank_page(page, bank)
+
+        for mode, toggle_id, point_label in bank.combinations:
+            filename = os.path.join(out_dir or "", bank.pdf_path(mode, point_label))
+            if toggle_id:
+                print(f"➡️ Switching to {mode} ({point_label})")
+                await apply_combination(page, bank, mode, toggle_id)
+
+            started = time.perf_counter()
+            await page.pdf(path=filename, format="A4", print_background=True)
+            if profiler:
+                profiler.record_pdf(bank, mode, point_label, time.perf_counter() - started)
+            print(f"📄 Saved {filename}")
+
+        if profiler:
+            await profiler.stop_chromium(bank, context)
+        browser = context.browser
+        await context.close()          # also writes the HAR when recording
+        if browser:
+            await browser.close()
+        if stats:
+            report_cache_stats(bank, stats)
+        if har_mode == "record":
+            print(f"📼 Recorded {har_path(bank)}")
+        print(f"✅ Completed PDFs for {bank.name}")
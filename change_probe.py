@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+change_probe.py
+
+Cheap "has anything changed?" check before launching a browser for a bank.
+
+Only banks with an explicit "probe" URL in banks.json are probed: the page
+URL of a JS-rendered bank says nothing reliable about its rates. The probe
+URL (ideally the endpoint the rates are loaded from) is fetched with a
+conditional GET, using the ETag / Last-Modified from the last full capture.
+A 304 means unchanged; otherwise the whole body, scripts included, is hashed
+and compared with the stored hash.
+
+Banks whose source is unchanged reuse the rows of their last capture, kept
+in PROBE_STATE. Reuse is capped at MAX_REUSE_HOURS after the probe that
+preceded that capture, well below the scheduler's daily period, so a daily
+run always recaptures. Any probe failure also means a full capture.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import NamedTuple, Optional
+
+import httpx
+
+from fast_path import new_client
+
+PROBE_STATE = "probe_state.json"
+MAX_REUSE_HOURS = 6
+
+
+class Probe(NamedTuple):
+    url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    digest: Optional[str]
+    unchanged: bool
+    checked_at: float
+
+
+def body_digest(resp):
+    return hashlib.sha256(resp.content).hexdigest()
+
+
+async def probe_bank(client, bank, prev):
+    """Probe one bank against its previous state; None if the probe failed."""
+    url = bank.probe
+    checked_at = time.time()
+    prev = prev if prev and prev.get("url") == url else None
+    headers = {}
+    if prev and prev.get("etag"):
+        headers["If-None-Match"] = prev["etag"]
+    if prev and prev.get("last_modified"):
+        headers["If-Modified-Since"] = prev["last_modified"]
+    try:
+        resp = await client.get(url, headers=headers)
+    except httpx.HTTPError as e:
+        print(f"⚠️ {bank.name} probe failed: {e}")
+        return None
+
+    if resp.status_code == 304 and prev:
+        return Probe(url, prev.get("etag"), prev.get("last_modified"), prev.get("digest"),
+                     True, checked_at)
+    if resp.status_code >= 400:
+        print(f"⚠️ {bank.name} probe got HTTP {resp.status_code}")
+        return None
+    digest = body_digest(resp)
+    return Probe(url, resp.headers.get("etag"), resp.headers.get("last-modified"), digest,
+                 bool(prev) and prev.get("digest") == digest, checked_at)
+
+
+class ProbeState:
+    """Last probe result and captured rows per bank, persisted as JSON."""
+
+    def __init__(self, path=PROBE_STATE):
+        self.path = path
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.banks = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.banks = {}
+
+    async def probe_all(self, banks):
+        """{bank name: Probe or None} for every bank with a probe URL, concurrently."""
+        banks = [b for b in banks if b.probe]
+        if not banks:
+            return {}
+        async with new_client() as client:
+            results = await asyncio.gather(
+                *(probe_bank(client, b, self.banks.get(b.name)) for b in banks))
+        return {b.name: r for b, r in zip(banks, results)}
+
+    def reusable(self, bank, probe, now=None):
+        """Previous rows if the source is unchanged and they're recent enough, else None."""
+        prev = self.banks.get(bank.name)
+        if not bank.probe or not probe or not probe.unchanged or not prev or not prev.get("rows"):
+            return None
+        age = (now or time.time()) - prev.get("captured_at", 0)
+        if age > MAX_REUSE_HOURS * 3600:
+            return None
+        return prev["rows"]
+
+    def record(self, bank, probe, rows):
+        """Remember a full capture; without a probe the bank just isn't reusable next time."""
+        if not bank.probe or not probe or not rows:
+            self.banks.pop(bank.name, None)
+            return
+        self.banks[bank.name] = {
+            "url": probe.url,
+            "etag": probe.etag,
+            "last_modified": probe.last_modified,
+            "digest": probe.digest,
+            "captured_at": probe.checked_at,
+            "rows": rows,
+        }
+
+    def save(self):
+        tmp = self.path + ".partial"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.banks, f, indent=2)
+        os.replace(tmp, self.path)
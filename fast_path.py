@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+fast_path.py
+
+Browserless fetch for banks whose rates are in static HTML or plain JSON.
+
+Banks with an "http" spec in banks.json are fetched with a shared, pooled
+httpx.AsyncClient instead of launching Chromium. HTML is reduced to text
+(scripts/styles and tags stripped) and searched with the bank's precompiled
+label patterns; JSON is walked along the configured key paths. The result is
+validated (every configured loan type present, every rate plausible) and
+fetch_rates() returns None whenever validation fails, so the caller falls
+back to the browser capture.
+
+Plausible isn't proof: a label pattern can just as well land on an APR
+column. So a bank's fast path is only used once FastPathTrust has seen its
+rates match a PDF extraction of the same page, for the current http spec,
+within the last REVERIFY_DAYS. Until then the pipeline captures as usual and
+uses the fast-path result only to check it.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from html import unescape
+
+import httpx
+
+TIMEOUT = 10.0
+MIN_RATE, MAX_RATE = 1.0, 20.0
+TRUST_FILE = "fast_path_trust.json"
+REVERIFY_DAYS = 7
+HEADERS = {
+    "User-Agent": ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"),
+    "Accept": "text/html,application/json;q=0.9,*/*;q=0.8",
+}
+
+_DROP = re.compile(r"<(script|style|noscript)\b.*?</\1>", re.IGNORECASE | re.DOTALL)
+_TAGS = re.compile(r"<[^>]+>")
+_SPACE = re.compile(r"\s+")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+def new_client():
+    """One pooled client for every fast-path bank in a run."""
+    return httpx.AsyncClient(
+        headers=HEADERS,
+        timeout=TIMEOUT,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+    )
+
+
+def html_text(html):
+    text = _TAGS.sub(" ", _DROP.sub(" ", html))
+    return _SPACE.sub(" ", unescape(text))
+
+
+def parse_html(spec, body):
+    text = html_text(body)
+    rates = {}
+    for loan, pattern in spec.labels.items():
+        m = pattern.search(text)
+        if m:
+            rates[loan] = m.group('rate')
+    return rates
+
+
+def parse_json(spec, body):
+    doc = json.loads(body)
+    rates = {}
+    for loan, path in spec.paths.items():
+        node = doc
+        try:
+            for key in path:
+                node = node[int(key)] if isinstance(node, list) else node[key]
+        except (KeyError, IndexError, ValueError, TypeError):
+            continue
+        rates[loan] = str(node)
+    return rates
+
+
+def validate(bank, rates):
+    """Every configured loan type found, each a plausible percentage."""
+    expected = {loan for boxes in bank.boxes.values() for loan in boxes}
+    if set(rates) < expected:
+        return False
+    for value in rates.values():
+        m = _NUMBER.search(str(value))
+        if not m or not MIN_RATE <= float(m.group()) <= MAX_RATE:
+            return False
+    return True
+
+
+async def fetch_rates(client, bank):
+    """
+    Rows for every combination of the bank from a plain HTTP fetch, or None
+    if the fetch fails or the rates don't validate.
+    """
+    spec = bank.http
+    started = time.perf_counter()
+    try:
+        resp = await client.get(spec.url or bank.url_for())
+        resp.raise_for_status()
+        parse = parse_json if spec.format == "json" else parse_html
+        rates = parse(spec, resp.text)
+    except (httpx.HTTPError, ValueError) as e:
+        print(f"⚠️ {bank.name} HTTP fast path failed: {e}")
+        return None
+
+    if not validate(bank, rates):
+        print(f"⚠️ {bank.name} HTTP fast path didn't validate ({rates}); using the browser")
+        return None
+
+    rows = []
+    for mode, _, point_label in bank.combinations:
+        for loan in bank.boxes.get(mode, {}):
+            rate = rates[loan]
+            if not str(rate).endswith('%'):
+                rate = f"{rate}%"
+            rows.append({'Bank': bank.name, 'Purpose': mode, 'Points': point_label, 'Loan Type': loan, 'Rate': rate})
+    print(f"⚡ {bank.name} via HTTP in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return rows
+
+
+async def fetch_all(banks):
+    """Fetch every bank with an http spec concurrently; {bank name: rows} for those that validated."""
+    banks = [b for b in banks if b.http]
+    if not banks:
+        return {}
+    async with new_client() as client:
+        results = await asyncio.gather(*(fetch_rates(client, b) for b in banks))
+    return {b.name: rows for b, rows in zip(banks, results) if rows}
+
+
+# --- Cross-checking against the browser capture ---
+
+def spec_fingerprint(bank):
+    """Changes whenever the bank's http spec (or its URL) does."""
+    spec = bank.http
+    doc = {
+        "url": spec.url or bank.url_for(),
+        "format": spec.format,
+        "labels": {k: p.pattern for k, p in sorted(spec.labels.items())},
+        "paths": {k: list(v) for k, v in sorted(spec.paths.items())},
+    }
+    return hashlib.sha256(json.dumps(doc, sort_keys=True).encode()).hexdigest()
+
+
+def _rate_key(rows):
+    out = {}
+    for r in rows:
+        m = _NUMBER.search(str(r['Rate']))
+        out[(r['Purpose'], r['Points'], r['Loan Type'])] = float(m.group()) if m else None
+    return out
+
+
+class FastPathTrust:
+    """Which banks' fast paths have matched a PDF extraction recently, persisted as JSON."""
+
+    def __init__(self, path=TRUST_FILE):
+        self.path = path
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.banks = json.load(f)
+        except (OSError, ValueError):
+            self.banks = {}
+
+    def trusted(self, bank, now=None):
+        entry = self.banks.get(bank.name)
+        if not bank.http or not entry or entry.get("spec") != spec_fingerprint(bank):
+            return False
+        return (now or time.time()) - entry.get("verified_at", 0) <= REVERIFY_DAYS * 86400
+
+    def verify(self, bank, fast_rows, pdf_rows):
+        """Trust the fast path only if it gave exactly the rates the PDF did."""
+        fast, pdf = _rate_key(fast_rows), _rate_key(pdf_rows)
+        if pdf and fast == pdf:
+            self.banks[bank.name] = {"spec": spec_fingerprint(bank), "verified_at": time.time()}
+            print(f"🤝 {bank.name} HTTP fast path matches the PDF; using it from now on")
+            return True
+        self.banks.pop(bank.name, None)
+        diff = {k: (fast.get(k), pdf.get(k)) for k in set(fast) | set(pdf) if fast.get(k) != pdf.get(k)}
+        print(f"⚠️ {bank.name} HTTP fast path disagrees with the PDF (http, pdf): {diff}")
+        return False
+
+    def save(self):
+        tmp = self.path + ".partial"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.banks, f, indent=2)
+        os.replace(tmp, self.path)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+job_queue.py
+
+Durable capture-job queue in a SQLite file, shared by one coordinator and any
+number of workers (e.g. containers mounting the same volume).
+
+A job is one (bank, mode, toggle, points) combination of a run. Workers claim
+jobs with a lease and keep extending it with heartbeats while they work; a
+job whose lease runs out (its worker died) goes back to being claimable,
+until it has been attempted MAX_ATTEMPTS times.
+
+The database must live on a filesystem with working POSIX locks (a local disk
+or a Docker volume shared between containers on the same host).
+"""
+
+import json
+import os
+import sqlite3
+import time
+
+QUEUE_DB = os.environ.get("REBOT_QUEUE_DB", "rebot_queue.sqlite")
+LEASE_SECONDS = 120
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    created     REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id      INTEGER NOT NULL REFERENCES runs(id),
+    bank        TEXT NOT NULL,
+    mode        TEXT NOT NULL,
+    toggle_id   TEXT NOT NULL,
+    point_label TEXT NOT NULL,
+    state       TEXT NOT NULL DEFAULT 'pending',   -- pending | running | done | failed
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    worker      TEXT,
+    lease_until REAL,
+    error       TEXT,
+    result      TEXT,                              -- JSON list of rows
+    updated     REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs(state, lease_until);
+CREATE INDEX IF NOT EXISTS jobs_run ON jobs(run_id, state);
+"""
+
+
+def connect(path=QUEUE_DB):
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def enqueue_run(conn, banks):
+    """Expand banks x combinations into jobs of a new run; return the run id."""
+    conn.execute("BEGIN IMMEDIATE")
+    run_id = conn.execute("INSERT INTO runs (created) VALUES (?)", (time.time(),)).lastrowid
+    conn.executemany(
+        "INSERT INTO jobs (run_id, bank, mode, toggle_id, point_label, updated) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [(run_id, bank.name, mode, toggle_id, point_label, time.time())
+         for bank in banks
+         for mode, toggle_id, point_label in bank.combinations],
+    )
+    conn.execute("COMMIT")
+    return run_id
+
+
+def claim(conn, worker, lease=LEASE_SECONDS):
+    """
+    Atomically take the oldest pending job, or a running job whose lease has
+    expired. Returns the job row or None.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        job = conn.execute(
+            "SELECT * FROM jobs WHERE attempts < ? AND "
+            "(state = 'pending' OR (state = 'running' AND lease_until < ?)) "
+            "ORDER BY id LIMIT 1",
+            (MAX_ATTEMPTS, now),
+        ).fetchone()
+        if job is None:
+            reap_expired(conn, now)
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE jobs SET state = 'running', worker = ?, lease_until = ?, "
+            "attempts = attempts + 1, updated = ? WHERE id = ?",
+            (worker, now + lease, now, job["id"]),
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return conn.execute("SELECT * FROM jobs WHERE id = ?", (job["id"],)).fetchone()
+
+
+def reap_expired(conn, now=None):
+    """Fail expired jobs that have used up their attempts."""
+    now = now or time.time()
+    conn.execute(
+        "UPDATE jobs SET state = 'failed', error = COALESCE(error, 'lease expired'), "
+        "updated = ? WHERE state = 'running' AND lease_until < ? AND attempts >= ?",
+        (now, now, MAX_ATTEMPTS),
+    )
+
+
+def heartbeat(conn, job_id, worker, lease=LEASE_SECONDS):
+    """Extend a lease; False if the job was reclaimed by someone else."""
+    cur = conn.execute(
+        "UPDATE jobs SET lease_until = ?, updated = ? "
+        "WHERE id = ? AND worker = ? AND state = 'running'",
+        (time.time() + lease, time.time(), job_id, worker),
+    )
+    return cur.rowcount == 1
+
+
+def complete(conn, job_id, worker, rows):
+    conn.execute(
+        "UPDATE jobs SET state = 'done', result = ?, error = NULL, updated = ? "
+        "WHERE id = ? AND worker = ?",
+        (json.dumps(rows), time.time(), job_id, worker),
+    )
+
+
+def fail(conn, job_id, worker, error):
+    """Record a failure; the job is retried until it runs out of attempts."""
+    conn.execute(
+        "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+        "error = ?, lease_until = NULL, updated = ? WHERE id = ? AND worker = ?",
+        (MAX_ATTEMPTS, str(error), time.time(), job_id, worker),
+    )
+
+
+def run_status(conn, run_id):
+    """{state: count} for a run."""
+    rows = conn.execute(
+        "SELECT state, COUNT(*) AS n FROM jobs WHERE run_id = ? GROUP BY state", (run_id,)
+    ).fetchall()
+    return {r["state"]: r["n"] for r in rows}
+
+
+def run_results(conn, run_id):
+    """Yield result rows of a run in job (i.e. BANKS) order."""
+    for job in conn.execute(
+        "SELECT result FROM jobs WHERE run_id = ? AND state = 'done' ORDER BY id", (run_id,)
+    ):
+        yield from json.loads(job["result"])
+
+
+def run_failures(conn, run_id):
+    return conn.execute(
+        "SELECT bank, mode, point_label, error FROM jobs "
+        "WHERE run_id = ? AND state = 'failed' ORDER BY id", (run_id,)
+    ).fetchall()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+parquet_export.py
+
+Date-partitioned Parquet dataset of every run's rates, for analysis.
+
+Each run is written as one file under EXPORT_DIR/date=YYYY-MM-DD/ (Hive
+partitioning), with typed columns:
+
+  run_id, captured_at (timestamp), bank / purpose / points / loan_type
+  (dictionary-encoded), rate (float64, null for "N/A"), rate_text (as
+  extracted), scenario and params (map of the scenario parameters).
+
+Frequent runs leave many small files, so compact() merges a partition into
+one file sorted by (bank, purpose, points, loan_type, captured_at), which
+keeps row-group statistics tight for predicate pushdown. Read it with e.g.
+
+    pyarrow.dataset.dataset("rates_parquet", partitioning="hive")
+    duckdb: SELECT * FROM read_parquet('rates_parquet/*/*.parquet', hive_partitioning=1)
+
+Rows appended from a JSONL file are partitioned by their own "Captured"
+time when they have one (sweep results), and LEDGER_FILE in the dataset root
+remembers what was exported, so re-exporting the append-only
+sweep_results.jsonl only adds the new scenarios.
+
+Usage:
+    python3 parquet_export.py backfill [--history rate_history.csv]
+    python3 parquet_export.py append runs/<run_id>.jsonl | sweep_results.jsonl
+    python3 parquet_export.py compact [--all]
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from rate_analytics import HISTORY_FILE, parse_rates
+
+EXPORT_DIR = "rates_parquet"
+COMPACT_MIN_FILES = 8          # compact today's partition once it has this many files
+COMPRESSION = "zstd"
+COMPACTED_FROM = b"rebot.compacted_from"
+LEDGER_FILE = "_exported.json"   # leading "_": dataset readers skip it
+
+_DICT = pa.dictionary(pa.int32(), pa.string())
+SCHEMA = pa.schema([
+    ("run_id", pa.string()),
+    ("captured_at", pa.timestamp("s")),
+    ("bank", _DICT),
+    ("purpose", _DICT),
+    ("points", _DICT),
+    ("loan_type", _DICT),
+    ("rate", pa.float64()),
+    ("rate_text", pa.string()),
+    ("scenario", pa.string()),
+    ("params", pa.map_(pa.string(), pa.string())),
+])
+SORT_KEYS = [("bank", "ascending"), ("purpose", "ascending"), ("points", "ascending"),
+             ("loan_type", "ascending"), ("captured_at", "ascending")]
+
+
+def partition_dir(date, root=EXPORT_DIR):
+    return os.path.join(root, f"date={date}")
+
+
+def to_table(rows, run_id, captured_at, params_by_bank=None):
+    """
+    Rows as extracted (dicts of strings) -> typed Arrow table. captured_at is
+    one datetime for the whole run, or a list with one per row.
+    """
+    params_by_bank = params_by_bank or {}
+    rows = list(rows)
+    stamps = captured_at if isinstance(captured_at, list) else [captured_at] * len(rows)
+    col = lambda key: [str(r.get(key, '')) for r in rows]
+    rate_text = col('Rate')
+    rate = parse_rates(rate_text) if rows else np.array([])
+    params = [r.get('Params') or params_by_bank.get(r.get('Bank'), {}) for r in rows]
+    return pa.table({
+        "run_id": pa.array([run_id] * len(rows), pa.string()),
+        "captured_at": pa.array(stamps, pa.timestamp("s")),
+        "bank": pa.array(col('Bank')).dictionary_encode(),
+        "purpose": pa.array(col('Purpose')).dictionary_encode(),
+        "points": pa.array(col('Points')).dictionary_encode(),
+        "loan_type": pa.array(col('Loan Type')).dictionary_encode(),
+        "rate": pa.array(rate, pa.float64(), mask=np.isnan(rate)),
+        "rate_text": pa.array(rate_text, pa.string()),
+        "scenario": pa.array([r.get('Scenario') for r in rows], pa.string()),
+        "params": pa.array([[(k, str(v)) for k, v in p.items()] for p in params],
+                           SCHEMA.field("params").type),
+    }, schema=SCHEMA)
+
+
+def _write(table, path, metadata=None):
+    if metadata:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+    tmp = path + ".partial"
+    pq.write_table(table, tmp, compression=COMPRESSION, use_dictionary=True)
+    os.replace(tmp, path)
+
+
+def export_run(rows, run_id, captured_at=None, params_by_bank=None, root=EXPORT_DIR):
+    """Append one run's rows as a new file in its date partition; returns the path."""
+    captured_at = captured_at or datetime.now().replace(microsecond=0)
+    table = to_table(rows, run_id, captured_at, params_by_bank)
+    if not table.num_rows:
+        return None
+    return _write_part(table, captured_at.strftime('%Y-%m-%d'), run_id, root)
+
+
+def _write_part(table, date, name, root):
+    part = partition_dir(date, root)
+    os.makedirs(part, exist_ok=True)
+    path = os.path.join(part, f"part-{name}.parquet")
+    _write(table, path)
+    return path
+
+
+def _finish_compactions(files):
+    """Drop inputs a previous compaction merged but didn't get to delete."""
+    remaining = set(files)
+    for path in sorted(files, reverse=True):       # newest compaction first
+        if path not in remaining or not os.path.basename(path).startswith("compacted-"):
+            continue
+        try:
+            meta = pq.read_schema(path).metadata or {}
+        except FileNotFoundError:
+            remaining.discard(path)
+            continue
+        for name in json.loads(meta.get(COMPACTED_FROM, b"[]")):
+            stale = os.path.join(os.path.dirname(path), name)
+            if stale != path and stale in remaining:
+                os.remove(stale)
+                remaining.discard(stale)
+    return sorted(remaining)
+
+
+def _sort_indices(table):
+    # Arrow can't sort dictionary columns directly; sort on their decoded values
+    keys = {}
+    for name, _ in SORT_KEYS:
+        column = table[name]
+        keys[name] = column.cast(pa.string()) if pa.types.is_dictionary(column.type) else column
+    return pc.sort_indices(pa.table(keys), sort_keys=SORT_KEYS)
+
+
+def compact(root=EXPORT_DIR, everything=False, today=None):
+    """
+    Merge small files: past partitions down to one file each, today's once it
+    reaches COMPACT_MIN_FILES (every partition with --all).
+    """
+    today = today or datetime.now().strftime('%Y-%m-%d')
+    merged = 0
+    for part in sorted(glob.glob(os.path.join(root, "date=*"))):
+        files = _finish_compactions(glob.glob(os.path.join(part, "*.parquet")))
+        current = part.endswith(f"date={today}")
+        if len(files) < 2 or (current and not everything and len(files) < COMPACT_MIN_FILES):
+            continue
+        table = pa.concat_tables(pq.read_table(f, schema=SCHEMA) for f in files)
+        table = table.take(_sort_indices(table)).unify_dictionaries().combine_chunks()
+        # Unique name, so the output can never be one of its own inputs
+        out = os.path.join(part, f"compacted-{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}.parquet")
+        _write(table, out, {COMPACTED_FROM: json.dumps([os.path.basename(f) for f in files])})
+        for f in files:
+            os.remove(f)
+        merged += len(files)
+    if merged:
+        print(f"🧱 Parquet compaction: merged {merged} files")
+    return merged
+
+
+def backfill(history=HISTORY_FILE, root=EXPORT_DIR):
+    """Export the CSV history (one pseudo-run per day) for days not in the dataset yet."""
+    by_date = defaultdict(list)
+    with open(history, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            by_date[row['Date']].append(row)
+    for date, rows in sorted(by_date.items()):
+        if not os.path.isdir(partition_dir(date, root)):
+            export_run(rows, f"history-{date}", datetime.strptime(date, '%Y-%m-%d'), root=root)
+    print(f"📦 Backfilled {len(by_date)} days from {history}")
+
+
+def _load_ledger(root):
+    try:
+        with open(os.path.join(root, LEDGER_FILE), encoding='utf-8') as f:
+            return set(json.load(f))
+    except (OSError, ValueError):
+        return set()
+
+
+def _save_ledger(root, keys):
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, LEDGER_FILE)
+    with open(path + ".partial", "w", encoding='utf-8') as f:
+        json.dump(sorted(keys), f)
+    os.replace(path + ".partial", path)
+
+
+def append_jsonl(path, root=EXPORT_DIR):
+    """
+    Export a run log or sweep results file. Rows carry their own Params and,
+    for sweeps, their own Captured time; anything exported before is skipped.
+    """
+    run_id = os.path.splitext(os.path.basename(path))[0]
+    fallback = datetime.fromtimestamp(int(os.path.getmtime(path)))
+    exported = _load_ledger(root)
+    by_date, new_keys = defaultdict(list), set()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            # A sweep scenario capture, or a whole run log
+            key = f"{row['Scenario']}@{row.get('Captured')}" if row.get('Scenario') else run_id
+            if key in exported:
+                continue
+            new_keys.add(key)
+            captured = (datetime.fromisoformat(row['Captured']).replace(microsecond=0)
+                        if row.get('Captured') else fallback)
+            by_date[captured.strftime('%Y-%m-%d')].append((row, captured))
+
+    count = 0
+    for date, items in sorted(by_date.items()):
+        table = to_table([r for r, _ in items], run_id, [c for _, c in items])
+        out = _write_part(table, date, f"{run_id}-{uuid.uuid4().hex[:8]}", root)
+        count += len(items)
+        print(f"📦 Exported {len(items)} rows to {out}")
+    _save_ledger(root, exported | new_keys)
+    print(f"📦 {count} new rows from {path}" if count else f"📦 Nothing new in {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the Parquet rate dataset.")
+    parser.add_argument("--root", default=EXPORT_DIR)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    bf = sub.add_parser("backfill")
+    bf.add_argument("--history", default=HISTORY_FILE)
+    ap = sub.add_parser("append")
+    ap.add_argument("jsonl")
+    cp = sub.add_parser("compact")
+    cp.add_argument("--all", action="store_true", help="also compact today's partition")
+    args = parser.parse_args()
+
+    if args.cmd == "backfill":
+        backfill(args.history, args.root)
+    elif args.cmd == "append":
+        append_jsonl(args.jsonl, args.root)
+    else:
+        compact(args.root, args.all)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+pdf_archive.py
+
+Content-addressed, compressed archive of captured PDFs.
+
+Each PDF is stored once (zlib-compressed, in ARCHIVE_DIR/blobs/ab/<hash>.z),
+keyed by the SHA-256 of its content with the per-render metadata Chromium
+writes (/CreationDate, /ModDate, trailer /ID) blanked out, so identical daily
+captures cost nothing extra. The first raw PDF seen is what's kept. A SQLite
+index maps (run, bank, mode, points) to blobs.
+
+Retention (apply_retention):
+  - keep every capture for KEEP_ALL_DAYS
+  - after that keep one capture per (bank, mode, points) per ISO week
+  - then, if the blobs exceed DISK_BUDGET_BYTES, evict least recently read
+    blobs (never those of the newest run) until under budget
+
+Usage:
+    python3 pdf_archive.py list [--bank NAME]
+    python3 pdf_archive.py get RUN_ID BANK MODE POINTS [-o out.pdf]
+    python3 pdf_archive.py prune
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import time
+import zlib
+from datetime import datetime, timedelta
+
+ARCHIVE_DIR = "archive"
+KEEP_ALL_DAYS = 30
+DISK_BUDGET_BYTES = 2 * 1024 ** 3
+COMPRESS_LEVEL = 9
+
+# Metadata that differs between two renders of the same page
+_VOLATILE = re.compile(
+    rb"/(CreationDate|ModDate)\s*\((?:\\.|[^\\)])*\)"
+    rb"|/ID\s*\[\s*<[0-9A-Fa-f]*>\s*<[0-9A-Fa-f]*>\s*\]"
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256      TEXT PRIMARY KEY,
+    size        INTEGER NOT NULL,
+    stored_size INTEGER NOT NULL,
+    created     REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS captures (
+    run_id      TEXT NOT NULL,
+    captured_at TEXT NOT NULL,               -- ISO timestamp
+    bank        TEXT NOT NULL,
+    mode        TEXT NOT NULL,
+    points      TEXT NOT NULL,
+    sha256      TEXT NOT NULL REFERENCES blobs(sha256),
+    PRIMARY KEY (run_id, bank, mode, points)
+);
+CREATE INDEX IF NOT EXISTS captures_lookup ON captures(bank, mode, points, captured_at);
+CREATE INDEX IF NOT EXISTS captures_blob ON captures(sha256);
+"""
+
+
+def content_digest(data):
+    """SHA-256 of a PDF with its render dates and document ID stripped."""
+    return hashlib.sha256(_VOLATILE.sub(b"", data)).hexdigest()
+
+
+class PdfArchive:
+
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, "index.sqlite"))
+        self.db.executescript(SCHEMA)
+
+    def _blob_path(self, sha):
+        return os.path.join(self.root, "blobs", sha[:2], sha + ".z")
+
+    # --- writing ---
+
+    def store(self, data, run_id, bank, mode, points, captured_at=None):
+        """Archive PDF bytes for one capture; returns the content hash."""
+        sha = content_digest(data)
+        now = time.time()
+        known = self.db.execute("SELECT 1 FROM blobs WHERE sha256 = ?", (sha,)).fetchone()
+        if not known:
+            path = self._blob_path(sha)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            packed = zlib.compress(data, COMPRESS_LEVEL)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(packed)
+            os.replace(tmp, path)
+            self.db.execute("INSERT INTO blobs VALUES (?, ?, ?, ?, ?)",
+                            (sha, len(data), len(packed), now, now))
+        else:
+            # A dedupe hit is a use too, so LRU eviction follows the latest capture
+            self.db.execute("UPDATE blobs SET last_access = ? WHERE sha256 = ?", (now, sha))
+        self.db.execute(
+            "INSERT OR REPLACE INTO captures VALUES (?, ?, ?, ?, ?, ?)",
+            (run_id, captured_at or datetime.now().isoformat(timespec="seconds"),
+             bank, mode, points, sha),
+        )
+        self.db.commit()
+        return sha
+
+    def store_file(self, path, run_id, bank, mode, points):
+        with open(path, "rb") as f:
+            return self.store(f.read(), run_id, bank, mode, points)
+
+    # --- reading ---
+
+    def read_blob(self, sha):
+        with open(self._blob_path(sha), "rb") as f:
+            data = zlib.decompress(f.read())
+        self.db.execute("UPDATE blobs SET last_access = ? WHERE sha256 = ?", (time.time(), sha))
+        self.db.commit()
+        return data
+
+    def read(self, bank, mode, points, run_id=None):
+        """PDF bytes of a capture: the given run's, or the latest one."""
+        if run_id:
+            row = self.db.execute(
+                "SELECT sha256 FROM captures WHERE run_id = ? AND bank = ? AND mode = ? AND points = ?",
+                (run_id, bank, mode, points)).fetchone()
+        else:
+            row = self.db.execute(
+                "SELECT sha256 FROM captures WHERE bank = ? AND mode = ? AND points = ? "
+                "ORDER BY captured_at DESC LIMIT 1", (bank, mode, points)).fetchone()
+        if row is None:
+            raise KeyError((run_id, bank, mode, points))
+        return self.read_blob(row[0])
+
+    def captures(self, bank=None):
+        sql = "SELECT run_id, captured_at, bank, mode, points, sha256 FROM captures"
+        args = ()
+        if bank:
+            sql += " WHERE bank = ?"
+            args = (bank,)
+        return self.db.execute(sql + " ORDER BY captured_at, bank, mode, points", args).fetchall()
+
+    # --- retention ---
+
+    def apply_retention(self, keep_all_days=KEEP_ALL_DAYS, budget=DISK_BUDGET_BYTES, now=None):
+        """Thin old captures to weekly, drop orphaned blobs, then LRU-evict to budget."""
+        now = now or datetime.now()
+        cutoff = (now - timedelta(days=keep_all_days)).isoformat(timespec="seconds")
+
+        # Older than the cutoff: keep the first capture of each ISO week
+        old = self.db.execute(
+            "SELECT rowid, captured_at, bank, mode, points FROM captures "
+            "WHERE captured_at < ? ORDER BY captured_at", (cutoff,)).fetchall()
+        seen, drop = set(), []
+        for rowid, captured_at, bank, mode, points in old:
+            week = datetime.fromisoformat(captured_at).isocalendar()[:2]
+            key = (bank, mode, points, week)
+            if key in seen:
+                drop.append((rowid,))
+            else:
+                seen.add(key)
+        self.db.executemany("DELETE FROM captures WHERE rowid = ?", drop)
+        removed = self._collect_garbage()
+
+        # Over budget: evict least recently read blobs, sparing the newest run
+        evicted = 0
+        total = self.db.execute("SELECT COALESCE(SUM(stored_size), 0) FROM blobs").fetchone()[0]
+        if total > budget:
+            latest = self.db.execute(
+                "SELECT run_id FROM captures ORDER BY captured_at DESC LIMIT 1").fetchone()
+            candidates = self.db.execute(
+                "SELECT sha256, stored_size FROM blobs WHERE sha256 NOT IN "
+                "(SELECT sha256 FROM captures WHERE run_id = ?) ORDER BY last_access",
+                (latest[0] if latest else "",)).fetchall()
+            for sha, stored in candidates:
+                if total <= budget:
+                    break
+                self.db.execute("DELETE FROM captures WHERE sha256 = ?", (sha,))
+                self._delete_blob(sha)
+                total -= stored
+                evicted += 1
+        self.db.commit()
+        print(f"🗄️ Archive retention: {len(drop)} captures thinned, "
+              f"{removed} orphaned blobs removed, {evicted} evicted, {total / 1_048_576:.1f} MB used")
+
+    def _collect_garbage(self):
+        orphans = self.db.execute(
+            "SELECT sha256 FROM blobs WHERE sha256 NOT IN (SELECT sha256 FROM captures)").fetchall()
+        for (sha,) in orphans:
+            self._delete_blob(sha)
+        return len(orphans)
+
+    def _delete_blob(self, sha):
+        self.db.execute("DELETE FROM blobs WHERE sha256 = ?", (sha,))
+        try:
+            os.remove(self._blob_path(sha))
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        self.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Browse and maintain the PDF archive.")
+    parser.add_argument("--root", default=ARCHIVE_DIR)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    ls = sub.add_parser("list")
+    ls.add_argument("--bank")
+    get = sub.add_parser("get")
+    get.add_argument("run_id")
+    get.add_argument("bank")
+    get.add_argument("mode")
+    get.add_argument("points")
+    get.add_argument("-o", "--output")
+    sub.add_parser("prune")
+    args = parser.parse_args()
+
+    archive = PdfArchive(args.root)
+    if args.cmd == "list":
+        for run_id, captured_at, bank, mode, points, sha in archive.captures(args.bank):
+            print(f"{run_id}  {captured_at}  {bank:<15} {mode:<10} {points:<4} {sha[:12]}")
+    elif args.cmd == "get":
+        data = archive.read(args.bank, args.mode, args.points, args.run_id)
+        out = args.output or f"{args.bank}_{args.mode}_{args.points}_{args.run_id}.pdf"
+        with open(out, "wb") as f:
+            f.write(data)
+        print(f"📄 Restored {out}")
+    else:
+        archive.apply_retention()
+    archive.close()
+
+
+if __name__ == "__main__":
+    main()
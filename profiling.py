@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+profiling.py
+
+Per-run profiling artifacts for the pipeline (emailscript.py --profile).
+
+Each stage (capture.<bank>, extract.<bank>, render_report) gets its own
+cProfile stats (<stage>.prof, loadable with pstats/snakeviz) and a text
+summary with the top functions and the top tracemalloc allocations made
+during the stage. For every bank page the Chromium side is recorded too: a
+Playwright trace (trace.<bank>.zip, open with `playwright show-trace`),
+Chromium performance metrics (JS heap, layout/style/script time) and the
+render time of each page.pdf() call.
+
+Everything lands in profiles/<run_id>/, with summary.json holding the
+numbers. Compare two runs with:
+
+    python3 profiling.py diff profiles/<run_a> profiles/<run_b>
+"""
+
+import argparse
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+PROFILE_DIR = "profiles"
+TOP_N = 25
+TRACE_FRAMES = 10
+
+# Chromium Performance.getMetrics entries worth keeping
+CHROMIUM_METRICS = [
+    "JSHeapUsedSize", "JSHeapTotalSize", "Nodes", "LayoutCount", "LayoutDuration",
+    "RecalcStyleDuration", "ScriptDuration", "TaskDuration",
+]
+
+
+def _safe(name):
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name)
+
+
+class Profiler:
+
+    def __init__(self, root=PROFILE_DIR, run_id=None):
+        self.run_id = run_id or datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.dir = os.path.join(root, self.run_id)
+        os.makedirs(self.dir, exist_ok=True)
+        self.summary = {"run_id": self.run_id, "stages": {}, "chromium": {}}
+        self._cdp = {}
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+
+    # --- Python side ---
+
+    @contextmanager
+    def stage(self, name):
+        """cProfile + tracemalloc for one stage; works around awaits too."""
+        prof = cProfile.Profile()
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        started = time.perf_counter()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            wall = time.perf_counter() - started
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            self._write_stage(name, prof, before, after, wall, peak)
+
+    def _write_stage(self, name, prof, before, after, wall, peak):
+        base = os.path.join(self.dir, _safe(name))
+        prof.dump_stats(base + ".prof")
+
+        out = io.StringIO()
+        out.write(f"Stage {name}: {wall:.3f}s wall, peak traced memory {peak / 1024:.0f} KB\n\n")
+        pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(TOP_N)
+        diffs = after.compare_to(before, "lineno")
+        out.write(f"\nTop {TOP_N} allocations during stage:\n")
+        for stat in diffs[:TOP_N]:
+            out.write(f"  {stat}\n")
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(out.getvalue())
+
+        self.summary["stages"][name] = {
+            "wall_s": round(wall, 4),
+            "peak_kb": round(peak / 1024, 1),
+            "alloc_kb": round(sum(s.size_diff for s in diffs) / 1024, 1),
+        }
+        self.save()
+
+    # --- Chromium side ---
+
+    async def start_chromium(self, bank, context, page):
+        """Begin a Playwright trace and enable CDP performance metrics for a bank page."""
+        await context.tracing.start(screenshots=True, snapshots=True)
+        client = await context.new_cdp_session(page)
+        await client.send("Performance.enable")
+        self._cdp[bank.name] = client
+        self.summary["chromium"][bank.name] = {"pdf_ms": {}}
+
+    def record_pdf(self, bank, mode, point_label, seconds):
+        entry = self.summary["chromium"].setdefault(bank.name, {"pdf_ms": {}})
+        entry["pdf_ms"][f"{mode}_{point_label}"] = round(seconds * 1000, 1)
+
+    async def stop_chromium(self, bank, context):
+        """Collect metrics and write the trace; call before closing the context."""
+        client = self._cdp.pop(bank.name, None)
+        if client:
+            result = await client.send("Performance.getMetrics")
+            metrics = {m["name"]: m["value"] for m in result["metrics"]}
+            self.summary["chromium"][bank.name]["metrics"] = {
+                k: metrics[k] for k in CHROMIUM_METRICS if k in metrics
+            }
+        path = os.path.join(self.dir, f"trace.{_safe(bank.name)}.zip")
+        await context.tracing.stop(path=path)
+        self.save()
+
+    def save(self):
+        with open(os.path.join(self.dir, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(self.summary, f, indent=2)
+
+
+def stage(profiler, name):
+    """profiler.stage(name), or a no-op when profiling is off."""
+    return profiler.stage(name) if profiler else nullcontext()
+
+
+# --- Comparing runs ---
+
+def _flatten(summary):
+    flat = {}
+    for name, s in summary["stages"].items():
+        for k, v in s.items():
+            flat[f"{name}.{k}"] = v
+    for bank, c in summary["chromium"].items():
+        for k, v in c.get("metrics", {}).items():
+            flat[f"chromium.{bank}.{k}"] = v
+        for k, v in c.get("pdf_ms", {}).items():
+            flat[f"chromium.{bank}.pdf_ms.{k}"] = v
+    return flat
+
+
+def diff_runs(a_dir, b_dir, out=sys.stdout):
+    with open(os.path.join(a_dir, "summary.json"), encoding="utf-8") as f:
+        a = _flatten(json.load(f))
+    with open(os.path.join(b_dir, "summary.json"), encoding="utf-8") as f:
+        b = _flatten(json.load(f))
+    out.write(f"{'metric':<60} {'A':>14} {'B':>14} {'change':>9}\n")
+    for key in sorted(set(a) | set(b)):
+        va, vb = a.get(key), b.get(key)
+        if va is None or vb is None:
+            change = "new" if va is None else "gone"
+        else:
+            change = f"{(vb - va) / va:+.0%}" if va else "—"
+        out.write(f"{key:<60} {va if va is not None else '':>14} "
+                  f"{vb if vb is not None else '':>14} {change:>9}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two profiling runs.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    d = sub.add_parser("diff")
+    d.add_argument("run_a")
+    d.add_argument("run_b")
+    args = parser.parse_args()
+    diff_runs(args.run_a, args.run_b)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+rate_analytics.py
+
+Rate history and analytics for the email report.
+
+Every run appends its rows to HISTORY_FILE with a Date column. analyze()
+loads the full history into a (series x day) NumPy matrix, where a series is
+one (bank, purpose, points, loan type), and computes with array operations:
+
+  - day-over-day change per series
+  - N-day moving average and volatility (std dev) per series
+  - best rate, best bank and cross-bank spread per (purpose, points, loan type)
+"""
+
+import csv
+import os
+from datetime import datetime
+
+import numpy as np
+
+HISTORY_FILE = 'rate_history.csv'
+HISTORY_FIELDS = ['Date', 'Bank', 'Purpose', 'Points', 'Loan Type', 'Rate']
+WINDOWS = (7, 30)
+
+
+def append_history(rows, path=HISTORY_FILE, date=None):
+    """Append today's extracted rows to the history file."""
+    date = date or datetime.now().strftime('%Y-%m-%d')
+    new_file = not os.path.exists(path)
+    with open(path, 'a', newline='', encoding='utf-8') as f:
+        w = csv.DictWriter(f, fieldnames=HISTORY_FIELDS, extrasaction='ignore')
+        if new_file:
+            w.writeheader()
+        for row in rows:
+            w.writerow(dict(row, Date=date))
+
+
+def parse_rates(raw):
+    """Vectorized '6.875%' -> 6.875; anything else ('N/A', '') -> NaN."""
+    raw = np.char.strip(np.asarray(raw, dtype=str))
+    out = np.full(raw.shape, np.nan)
+    ok = np.char.endswith(raw, '%')
+    if ok.any():
+        out[ok] = np.char.rstrip(raw[ok], '%').astype(float)
+    return out
+
+
+def load_history(path=HISTORY_FILE):
+    """Read the history file into column arrays."""
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        cols = list(zip(*reader))
+    if not cols:
+        return None
+    return {name: np.asarray(col, dtype=str) for name, col in zip(header, cols)}
+
+
+def rolling(matrix, window):
+    """
+    NaN-aware trailing moving average and std dev along the day axis.
+    The mean is NaN only for days with no observation in the window; the
+    std dev needs at least two, so it is NaN for days with fewer.
+    """
+    valid = ~np.isnan(matrix)
+    x = np.where(valid, matrix, 0.0)
+    pad = np.zeros((matrix.shape[0], 1))
+    cs = np.concatenate([pad, np.cumsum(x, axis=1)], axis=1)
+    cs2 = np.concatenate([pad, np.cumsum(x * x, axis=1)], axis=1)
+    cn = np.concatenate([pad, np.cumsum(valid, axis=1)], axis=1)
+
+    hi = np.arange(1, matrix.shape[1] + 1)
+    lo = np.maximum(hi - window, 0)
+    n = cn[:, hi] - cn[:, lo]
+    s = cs[:, hi] - cs[:, lo]
+    s2 = cs2[:, hi] - cs2[:, lo]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(n > 0, s / n, np.nan)
+        var = np.where(n > 1, (s2 - n * mean * mean) / (n - 1), np.nan)
+    return mean, np.sqrt(np.clip(var, 0.0, None))
+
+
+def analyze(path=HISTORY_FILE, windows=WINDOWS):
+    """
+    Compute analytics over the whole history. Returns a dict with
+      'series':   {(bank, purpose, points, loan): {'Change', 'MA Nd', 'Vol Nd'}}
+      'products': [{'Purpose', 'Points', 'Loan Type', 'Best Rate', 'Best Bank', 'Spread'}]
+    for the most recent day, plus the raw matrices under 'arrays'.
+    """
+    if not os.path.exists(path):
+        return None
+    h = load_history(path)
+    if h is None:
+        return None
+
+    # --- pivot to (series x day) ---
+    days, day_idx = np.unique(h['Date'], return_inverse=True)
+    series_keys = np.stack([h['Bank'], h['Purpose'], h['Points'], h['Loan Type']], axis=1)
+    series, series_idx = np.unique(series_keys, axis=0, return_inverse=True)
+    series_idx = series_idx.reshape(-1)
+    matrix = np.full((len(series), len(days)), np.nan)
+    matrix[series_idx, day_idx] = parse_rates(h['Rate'])
+
+    # --- per-series stats ---
+    change = np.full(len(series), np.nan)
+    if len(days) > 1:
+        change = matrix[:, -1] - matrix[:, -2]
+    rolled = {w: rolling(matrix, w) for w in windows}
+
+    # --- per-product cross-bank stats ---
+    products, product_idx = np.unique(series[:, 1:], axis=0, return_inverse=True)
+    product_idx = product_idx.reshape(-1)
+    best = np.full((len(products), len(days)), np.inf)
+    worst = np.full((len(products), len(days)), -np.inf)
+    np.fmin.at(best, product_idx, matrix)
+    np.fmax.at(worst, product_idx, matrix)
+    best[np.isinf(best)] = np.nan
+    worst[np.isinf(worst)] = np.nan
+    spread = worst - best
+
+    # Bank holding the best rate on the last day
+    last = matrix[:, -1]
+    is_best = np.isclose(last, best[product_idx, -1])
+    best_bank = np.full(len(products), '', dtype=object)
+    for i in np.flatnonzero(is_best)[::-1]:
+        best_bank[product_idx[i]] = str(series[i, 0])
+
+    columns = ['Change'] + [f'{k} {w}d' for w in windows for k in ('MA', 'Vol')]
+    result = {'series': {}, 'products': [], 'days': days, 'columns': columns,
+              'arrays': {'matrix': matrix, 'best': best, 'spread': spread,
+                         'series': series, 'products': products}}
+    for i, key in enumerate(map(tuple, series.tolist())):
+        stats = {'Change': fmt_change(change[i])}
+        for w, (mean, std) in rolled.items():
+            stats[f'MA {w}d'] = fmt_rate(mean[i, -1])
+            stats[f'Vol {w}d'] = fmt_num(std[i, -1])
+        result['series'][key] = stats
+    for j, (purpose, points, loan) in enumerate(products.tolist()):
+        result['products'].append({
+            'Purpose': purpose,
+            'Points': points,
+            'Loan Type': loan,
+            'Best Rate': fmt_rate(best[j, -1]),
+            'Best Bank': best_bank[j] or 'N/A',
+            'Spread': fmt_num(spread[j, -1]),
+        })
+    return result
+
+
+def fmt_rate(x):
+    return 'N/A' if np.isnan(x) else f'{x:.3f}%'
+
+
+def fmt_num(x):
+    return 'N/A' if np.isnan(x) else f'{x:.3f}'
+
+
+def fmt_change(x):
+    if np.isnan(x):
+        return 'N/A'
+    return '—' if x == 0 else f'{x:+.3f}'
+
+
+def annotate(rates_by_bank, analytics):
+    """Add the per-series analytics as extra columns on the report rows."""
+    if not analytics:
+        return rates_by_bank
+    blank = dict.fromkeys(analytics['columns'], 'N/A')
+    for bank, entries in rates_by_bank.items():
+        for row in entries:
+            key = (bank, row['Purpose'], row['Points'], row['Loan Type'])
+            row.update(analytics['series'].get(key, blank))
+    return rates_by_bank
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+rate_extraction.py
+
+Turn one captured PDF view into result rows using a compiled BankPlan:
+crop to the configured bboxes (if any), apply the bank's regex and build
+{'Bank', 'Purpose', 'Points', 'Loan Type', 'Rate'} rows.
+"""
+
+import pdfplumber
+
+FIELDS = ['Bank', 'Purpose', 'Points', 'Loan Type', 'Rate']
+
+
+def extract_pdf(bank, mode, point_label, source):
+    """
+    Return the rows for one (bank, mode, points) view. `source` is a path or a
+    binary file object (e.g. io.BytesIO of page.pdf() output).
+    """
+    rows = []
+    pat = bank.pattern
+    with pdfplumber.open(source) as pdf:
+        page = pdf.pages[bank.page]
+        boxes = bank.boxes.get(mode, {})
+        if boxes:
+            for loan, bbox in boxes.items():
+                txt = page.within_bbox(bbox).extract_text() or ""
+                m = pat.search(txt)
+                rate = m.group('rate') if m else 'N/A'
+                rows.append({'Bank': bank.name, 'Purpose': mode, 'Points': point_label, 'Loan Type': loan, 'Rate': rate})
+        else:
+            # fallback: full-page search
+            text = page.extract_text() or ""
+            for m in pat.finditer(text):
+                rows.append({'Bank': bank.name, 'Purpose': mode, 'Points': point_label or 'N/A', 'Loan Type': 'N/A', 'Rate': m.group('rate')})
+    return rows
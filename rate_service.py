@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+rate_service.py
+
+Small local HTTP service for on-demand rates.
+
+Rates are served from an in-memory cache, seeded from the last published
+all_cleaned_rates.csv. Each bank has a TTL ("ttl" in banks.json, default one
+hour). A request for a stale bank triggers one refresh of that bank (HTTP fast
+path if it has one, otherwise a browser capture); concurrent requests for the
+same bank share that refresh (single-flight) instead of each launching a
+browser. Every response says how old the data is.
+
+Browser refreshes use their own profiles (SERVICE_PROFILE_ROOT) and a temp
+directory for PDFs, so they never touch the pipeline's profiles or PDFs, and
+give up at once if another process is already capturing the same bank.
+
+Endpoints:
+    GET /rates/<bank>                 one bank
+    GET /rates?bank=A&bank=B          several banks (all banks without ?bank=)
+    GET /health
+Query options:
+    stale=ok     answer immediately with cached data, refreshing in the background
+    refresh=1    force a refresh even if the data is fresh
+
+Usage:
+    python3 rate_service.py [--host 127.0.0.1] [--port 8080]
+"""
+
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, wait
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+
+from flask import Flask, abort, jsonify, request
+
+from bank_config import BASE_DIR, PlanWatcher
+from capture_engine import capture_pdfs
+from fast_path import FastPathTrust, fetch_all
+from rate_extraction import extract_pdf
+
+SNAPSHOT = "all_cleaned_rates.csv"
+REFRESH_TIMEOUT = 180      # seconds a request waits for a refresh before answering stale
+MAX_BROWSERS = 2           # concurrent browser captures
+SERVICE_PROFILE_ROOT = Path("service_profiles")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+app = Flask(__name__)
+
+
+class Entry(NamedTuple):
+    rows: list
+    fetched_at: float
+    source: str          # "snapshot", "http" or "browser"
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers share its Future."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is not None:
+                return fut
+            fut = self._calls[key] = Future()
+
+        def run():
+            try:
+                fut.set_result(fn())
+            except BaseException as e:
+                fut.set_exception(e)
+            finally:
+                with self._lock:
+                    del self._calls[key]
+
+        threading.Thread(target=run, name=f"refresh-{key}", daemon=True).start()
+        return fut
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+
+WATCHER = None
+CACHE = {}
+CACHE_LOCK = threading.Lock()
+FLIGHTS = SingleFlight()
+BROWSER_SLOTS = threading.Semaphore(MAX_BROWSERS)
+
+
+def seed_cache(path=SNAPSHOT):
+    """Load the last published CSV so the service answers straight away."""
+    if not os.path.exists(path):
+        return
+    fetched_at = os.path.getmtime(path)
+    by_bank = defaultdict(list)
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            by_bank[row['Bank']].append(row)
+    with CACHE_LOCK:
+        for bank, rows in by_bank.items():
+            CACHE[bank] = Entry(rows, fetched_at, "snapshot")
+    logging.info(f"Seeded cache with {len(by_bank)} banks from {path}")
+
+
+async def _fetch(bank):
+    if FastPathTrust().trusted(bank):
+        fast = await fetch_all([bank])
+        if bank.name in fast:
+            return fast[bank.name], "http"
+    rows = []
+    with BROWSER_SLOTS, tempfile.TemporaryDirectory(prefix="rebot-service-") as out_dir:
+        await capture_pdfs(bank, out_dir=out_dir, profile_root=SERVICE_PROFILE_ROOT,
+                           wait_for_lock=False)
+        for mode, _, point_label in bank.combinations:
+            pdf_f = os.path.join(out_dir, bank.pdf_path(mode, point_label))
+            if os.path.exists(pdf_f):
+                rows.extend(extract_pdf(bank, mode, point_label, pdf_f))
+    return rows, "browser"
+
+
+def refresh(bank):
+    logging.info(f"Refreshing {bank.name}")
+    started = time.monotonic()
+    rows, source = asyncio.run(_fetch(bank))
+    entry = Entry(rows, time.time(), source)
+    with CACHE_LOCK:
+        CACHE[bank.name] = entry
+    logging.info(f"Refreshed {bank.name} via {source} in {time.monotonic() - started:.1f}s")
+    return entry
+
+
+def describe(bank, entry, error=None):
+    now = time.time()
+    out = {
+        "bank": bank.name,
+        "ttl_seconds": bank.ttl,
+        "refreshing": FLIGHTS.in_flight(bank.name),
+    }
+    if entry:
+        age = now - entry.fetched_at
+        out.update(
+            rates=entry.rows,
+            fetched_at=datetime.fromtimestamp(entry.fetched_at).isoformat(timespec="seconds"),
+            age_seconds=round(age, 1),
+            stale=age > bank.ttl,
+            source=entry.source,
+        )
+    else:
+        out.update(rates=[], fetched_at=None, age_seconds=None, stale=True, source=None)
+    if error:
+        out["error"] = error
+    return out
+
+
+def lookup(banks, allow_stale, force):
+    """Serve banks from cache, refreshing stale ones (shared, concurrently)."""
+    with CACHE_LOCK:
+        entries = {b.name: CACHE.get(b.name) for b in banks}
+
+    pending = {}
+    for bank in banks:
+        entry = entries[bank.name]
+        if force or entry is None or time.time() - entry.fetched_at > bank.ttl:
+            pending[bank.name] = FLIGHTS.do(bank.name, lambda b=bank: refresh(b))
+
+    errors = {}
+    if pending and not (allow_stale and all(entries[n] for n in pending)):
+        wait(pending.values(), timeout=REFRESH_TIMEOUT)
+        for name, fut in pending.items():
+            if not fut.done():
+                errors[name] = "refresh still running"
+                continue
+            try:
+                entries[name] = fut.result()
+            except Exception as e:
+                errors[name] = f"refresh failed: {e}"
+    return [describe(b, entries[b.name], errors.get(b.name)) for b in banks]
+
+
+def flag(name):
+    return request.args.get(name, "").lower() in ("1", "true", "yes", "ok")
+
+
+@app.get("/rates/<name>")
+def bank_rates(name):
+    try:
+        bank = WATCHER.current().bank(name)
+    except KeyError:
+        abort(404, description=f"Unknown bank {name}")
+    return jsonify(lookup([bank], flag("stale"), flag("refresh"))[0])
+
+
+@app.get("/rates")
+def bulk_rates():
+    plan = WATCHER.current()
+    names = request.args.getlist("bank")
+    try:
+        banks = [plan.bank(n) for n in names] if names else list(plan.banks)
+    except KeyError as e:
+        abort(404, description=f"Unknown bank {e.args[0]}")
+    return jsonify({"banks": lookup(banks, flag("stale"), flag("refresh"))})
+
+
+@app.get("/health")
+def health():
+    with CACHE_LOCK:
+        cached = len(CACHE)
+    return jsonify({"ok": True, "banks": len(WATCHER.current().banks), "cached": cached})
+
+
+def main():
+    global WATCHER
+    parser = argparse.ArgumentParser(description="Serve cached mortgage rates over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    os.chdir(BASE_DIR)
+    WATCHER = PlanWatcher()
+    seed_cache()
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
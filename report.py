@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+report.py
+
+Render the rates report in one pass over the results.
+
+The layout (inline styles, table/heading tags) is compiled once per color
+scheme and cached. render_report() then walks the rows a single time and
+produces, side by side:
+
+  - the HTML email body
+  - a plain-text alternative with the same content
+  - CSV and JSON attachments of the data rows
+
+Every value is HTML-escaped in the HTML output.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+from functools import lru_cache
+from html import escape
+from string import Template
+from typing import NamedTuple
+
+# --- Define styling colors ---
+company_colors = {
+    "blue": "#175892",
+    "red": "#ce2d47",
+    "light": "#f6f9f9",
+    "gray": "#555"
+}
+
+
+class Layout(NamedTuple):
+    doc: Template
+    title: Template
+    section: Template
+    table_open: str
+    table_close: str
+    th: str
+    td: str
+    footer: Template
+
+
+class Report(NamedTuple):
+    html: str
+    text: str
+    csv: str
+    json: str
+
+
+@lru_cache(maxsize=None)
+def compile_layout(colors):
+    """Build the static markup for a color scheme (a tuple of (name, value) pairs)."""
+    c = dict(colors)
+    return Layout(
+        doc=Template('<html><body style="font-family:Arial,sans-serif; '
+                     f'background:{c["light"]}; color:#333; padding:20px;">$body</body></html>'),
+        title=Template(f'<h2 style="color:{c["blue"]};">$text</h2>'),
+        section=Template(f'<h3 style="color:{c["blue"]};">$text</h3>'),
+        table_open=('<table style="border-collapse:collapse; width:100%; max-width:600px; '
+                    'margin-bottom:20px;"><thead><tr>'),
+        table_close='</tbody></table>',
+        th=('<th style="border:1px solid #ccc; padding:6px; '
+            f'background:{c["blue"]}; color:#fff;">'),
+        td='<td style="border:1px solid #ccc; padding:6px;">',
+        footer=Template(f'<p style="font-size:small; color:{c["gray"]};">$text</p>'),
+    )
+
+
+def render_report(rates_by_bank, analytics=None, date_str=None, colors=company_colors):
+    """
+    Render HTML, plain text, CSV and JSON for the grouped rows in one pass.
+    `analytics` (from rate_analytics.analyze) adds a best-rates section.
+    """
+    L = compile_layout(tuple(colors.items()))
+    date_str = date_str or datetime.now().strftime('%Y-%m-%d')
+    title = f"Mortgage Rates – {date_str}"
+
+    html = [L.title.substitute(text=escape(title))]
+    text = [title, "=" * len(title), ""]
+    csv_buf = io.StringIO()
+    csv_out = None
+    json_rows = []
+
+    sections = []
+    if analytics and analytics['products']:
+        sections.append(('Best Rates by Product', analytics['products'], False))
+    sections.extend((bank, entries, True) for bank, entries in rates_by_bank.items())
+
+    for name, entries, is_data in sections:
+        if not entries:
+            continue
+        cols = list(entries[0].keys())
+        html.append(L.section.substitute(text=escape(name)))
+        html.append(L.table_open)
+        html.extend(L.th + escape(c) + '</th>' for c in cols)
+        html.append('</tr></thead><tbody>')
+        text.append(name)
+        text.append("-" * len(name))
+        if is_data and csv_out is None:
+            csv_out = csv.DictWriter(csv_buf, fieldnames=cols, extrasaction='ignore', restval='')
+            csv_out.writeheader()
+
+        for row in entries:
+            values = [str(row.get(c, '')) for c in cols]
+            html.append('<tr>' + ''.join(L.td + escape(v) + '</td>' for v in values) + '</tr>')
+            text.append("  " + " | ".join(f"{c}: {v}" for c, v in zip(cols, values)))
+            if is_data:
+                csv_out.writerow(row)
+                json_rows.append(json.dumps(row, ensure_ascii=False))
+
+        html.append(L.table_close)
+        text.append("")
+
+    footer = f"Generated on {date_str}"
+    html.append(L.footer.substitute(text=escape(footer)))
+    text.append(footer)
+
+    return Report(
+        html=L.doc.substitute(body=''.join(html)),
+        text="\n".join(text),
+        csv=csv_buf.getvalue(),
+        json="[\n" + ",\n".join(json_rows) + "\n]\n",
+    )
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+result_sink.py
+
+Streaming, append-only output for a run.
+
+Rows are written as soon as each (bank, mode, points) extraction finishes:
+to runs/<run_id>.jsonl (the run log) and to <out>.partial (CSV), both flushed
+and fsynced per batch, so a crash late in the run loses nothing and
+`tail -f` shows progress live. publish() atomically renames the partial CSV
+over the final snapshot (all_cleaned_rates.csv), so readers only ever see a
+complete file.
+
+The sink behaves like the list extract_rates() used to fill: append() and
+extend() both work.
+"""
+
+import csv
+import json
+import os
+from datetime import datetime
+
+from rate_extraction import FIELDS
+
+RUN_DIR = "runs"
+OUT_FILE = "all_cleaned_rates.csv"
+BATCH_SIZE = 50
+
+
+class ResultSink:
+
+    def __init__(self, out=OUT_FILE, run_dir=RUN_DIR, run_id=None, batch_size=BATCH_SIZE):
+        self.run_id = run_id or datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.out = out
+        self.partial = out + ".partial"
+        self.batch_size = batch_size
+        self.count = 0
+        self._buffer = []
+
+        os.makedirs(run_dir, exist_ok=True)
+        self.log_path = os.path.join(run_dir, f"{self.run_id}.jsonl")
+        self._log = open(self.log_path, "a", encoding="utf-8")
+        self._csv_file = open(self.partial, "w", newline="", encoding="utf-8")
+        self._csv = csv.DictWriter(self._csv_file, fieldnames=FIELDS, extrasaction="ignore")
+        self._csv.writeheader()
+
+    def append(self, row):
+        self._buffer.append(row)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def extend(self, rows):
+        """Add one extraction's rows and commit them as a batch."""
+        self._buffer.extend(rows)
+        self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        for row in self._buffer:
+            self._log.write(json.dumps(row) + "\n")
+        self._csv.writerows(self._buffer)
+        for f in (self._log, self._csv_file):
+            f.flush()
+            os.fsync(f.fileno())
+        self.count += len(self._buffer)
+        self._buffer.clear()
+
+    def rows(self):
+        """Stream every row written so far back from the run log."""
+        self.flush()
+        with open(self.log_path, encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def publish(self):
+        """Atomically replace the final snapshot with this run's CSV."""
+        self.flush()
+        self._csv_file.close()
+        os.replace(self.partial, self.out)
+        return self.out
+
+    def close(self):
+        self.flush()
+        self._log.close()
+        if not self._csv_file.closed:
+            self._csv_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -4,14 +4,21 @@ simple_scheduler.py
 
 A basic scheduler: at specified times, run external scripts.
 Add more entries to JOBS to schedule additional scripts.
+
+The bank plan (banks.json) is hot-reloaded while the scheduler runs: edits
+are validated as soon as they land, and scripts are always started against
+the last config that validated.
 """
 
+import os
 import time
 import subprocess
 import schedule
 import logging
 from pathlib import Path
 
+from bank_config import PlanWatcher
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -27,6 +34,8 @@ JOBS = [
     ("16:57", "emailscript.py"),
 ]
 
+PLAN_WATCHER = None
+
 def run_script(path: str):
     """Invoke the given script as a subprocess."""
     script = Path(path)
@@ -39,7 +48,11 @@ def run_script(path: str):
         # cmd = ["python3", str(script)]
         # Otherwise, rely on shebang/executable bit:
         cmd = [str(script)]
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        env = dict(os.environ)
+        if PLAN_WATCHER:
+            PLAN_WATCHER.current()
+            env["REBOT_BANKS_CONFIG"] = PLAN_WATCHER.last_good_path
+        result = subprocess.run(cmd, check=True, capture_output=True, text=True, env=env)
         logging.info(f"Finished {path} (exit {result.returncode})")
         if result.stdout:
             logging.info(f"  Output:\n{result.stdout}")
@@ -57,10 +70,14 @@ def schedule_jobs():
         logging.info(f"Scheduled {script} at {t} daily")
 
 def main():
+    global PLAN_WATCHER
     logging.info("Scheduler starting up")
+    PLAN_WATCHER = PlanWatcher()
+    logging.info(f"Loaded bank plan ({len(PLAN_WATCHER.plan.banks)} banks)")
     schedule_jobs()
     try:
         while True:
+            PLAN_WATCHER.current()
             schedule.run_pending()
             time.sleep(1)
     except KeyboardInterrupt:
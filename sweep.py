@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+sweep.py
+
+Parameter sweep: expand a bank's templated URL/form inputs (see "url_template",
+"form" and "params" in banks.json) over a matrix of scenarios such as ZIP
+codes, credit scores and loan amounts, and capture every scenario.
+
+Scenarios are generated lazily and fed through a bounded queue to a fixed
+number of workers that share the bank's persistent browser context, so memory
+stays flat however large the matrix is. Rows are appended to the output JSONL
+as soon as their scenario finishes, tagged with the scenario's parameters.
+With --resume, scenarios already present in the output are skipped.
+
+The sweep runs on its own profiles (SWEEP_PROFILE_ROOT), never the
+pipeline's browser_profiles/, so a long sweep can't lock the scheduled run
+out of a bank's profile.
+
+Matrix file (JSON):
+    {"zip_code": ["32669", "10001"], "credit_score": [680, 740]}
+
+Usage:
+    python3 sweep.py --bank Bankrate --matrix sweep_matrix.json [--concurrency 4]
+    python3 sweep.py --bank Bankrate --param zip_code=32669,10001 --param credit_score=680,740
+"""
+
+import argparse
+import asyncio
+import hashlib
+import io
+import itertools
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+from playwright.async_api import async_playwright
+
+from bank_config import BASE_DIR, load_plan
+from capture_engine import apply_combination, load_bank_page, open_bank_context
+from rate_extraction import extract_pdf
+
+OUT_FILE = "sweep_results.jsonl"
+CONCURRENCY = 4
+SWEEP_PROFILE_ROOT = Path("sweep_profiles")
+
+
+def scenario_id(params):
+    """Stable id for a full parameter set."""
+    blob = json.dumps(params, sort_keys=True).encode("utf-8")
+    return hashlib.sha1(blob).hexdigest()[:12]
+
+
+def expand(matrix):
+    """Lazily yield one {param: value} dict per point of the matrix."""
+    keys = list(matrix)
+    for values in itertools.product(*(matrix[k] for k in keys)):
+        yield {k: str(v) for k, v in zip(keys, values)}
+
+
+def done_ids(path):
+    """Scenario ids that already have rows in the output file."""
+    ids = set()
+    if not os.path.exists(path):
+        return ids
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                ids.add(json.loads(line)["Scenario"])
+            except (ValueError, KeyError):
+                continue
+    return ids
+
+
+class JsonlWriter:
+    """Append-only JSONL output, flushed after every scenario."""
+
+    def __init__(self, path):
+        self.f = open(path, "a", encoding="utf-8")
+
+    def write(self, rows):
+        for row in rows:
+            self.f.write(json.dumps(row) + "\n")
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+async def run_scenario(page, bank, params):
+    """Load one scenario, capture every combination and return tagged rows."""
+    full = bank.scenario(params)
+    sid = scenario_id(full)
+    await load_bank_page(page, bank, params)
+
+    rows = []
+    for mode, toggle_id, point_label in bank.combinations:
+        await apply_combination(page, bank, mode, toggle_id)
+        pdf = await page.pdf(format="A4", print_background=True)
+        # pdfplumber is CPU-bound; keep the event loop free for other workers
+        extracted = await asyncio.to_thread(extract_pdf, bank, mode, point_label, io.BytesIO(pdf))
+        rows.extend(extracted)
+
+    captured = datetime.now().isoformat(timespec="seconds")
+    for row in rows:
+        row.update(Scenario=sid, Params=full, Captured=captured)
+    return rows
+
+
+async def worker(context, bank, queue, writer, counts):
+    page = await context.new_page()
+    while True:
+        params = await queue.get()
+        if params is None:
+            queue.task_done()
+            break
+        try:
+            writer.write(await run_scenario(page, bank, params))
+            counts["done"] += 1
+        except Exception as e:
+            counts["failed"] += 1
+            print(f"❌ Scenario {params} failed: {e}")
+        finally:
+            queue.task_done()
+        if (counts["done"] + counts["failed"]) % 25 == 0:
+            print(f"⏳ {counts['done']} done, {counts['failed']} failed")
+    await page.close()
+
+
+async def sweep(bank, scenarios, out_path, concurrency):
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    writer = JsonlWriter(out_path)
+    counts = {"done": 0, "failed": 0}
+    started = time.monotonic()
+
+    async with async_playwright() as p:
+        context, _ = await open_bank_context(p, bank, SWEEP_PROFILE_ROOT)
+        workers = [asyncio.create_task(worker(context, bank, queue, writer, counts))
+                   for _ in range(concurrency)]
+        for params in scenarios:
+            await queue.put(params)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+        await context.close()
+
+    writer.close()
+    print(f"✅ Sweep finished: {counts['done']} scenarios, {counts['failed']} failed "
+          f"in {time.monotonic() - started:.0f}s → {out_path}")
+
+
+def parse_matrix(args, bank):
+    matrix = {}
+    if args.matrix:
+        with open(args.matrix, encoding="utf-8") as f:
+            matrix.update(json.load(f))
+    for item in args.param or []:
+        key, _, values = item.partition("=")
+        matrix[key] = values.split(",")
+    unknown = set(matrix) - set(bank.params)
+    if unknown:
+        raise SystemExit(f"❌ {bank.name} has no template params {sorted(unknown)}; "
+                         f"known: {sorted(bank.params)}")
+    if not matrix:
+        raise SystemExit("❌ Empty matrix; use --matrix or --param")
+    return matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture a bank over a parameter matrix.")
+    parser.add_argument("--bank", required=True)
+    parser.add_argument("--matrix", help="JSON file of {param: [values]}")
+    parser.add_argument("--param", action="append", help="param=v1,v2,... (repeatable)")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--out", default=OUT_FILE)
+    parser.add_argument("--resume", action="store_true",
+                        help="skip scenarios already in the output file")
+    args = parser.parse_args()
+
+    os.chdir(BASE_DIR)
+    bank = load_plan().bank(args.bank)
+    scenarios = expand(parse_matrix(args, bank))
+    if args.resume:
+        skip = done_ids(args.out)
+        scenarios = (s for s in scenarios if scenario_id(bank.scenario(s)) not in skip)
+    asyncio.run(sweep(bank, scenarios, args.out, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+worker.py
+
+Coordinator/worker mode for scaling captures across containers.
+
+    python3 worker.py coordinator   # enqueue BANKS x combinations, wait, write the CSV
+    python3 worker.py worker        # claim jobs from the shared queue until stopped
+
+All processes point REBOT_QUEUE_DB at the same SQLite file (see job_queue.py).
+Each worker keeps one persistent browser context per bank open across jobs
+(in a private temp profile root, so workers never collide with each other or
+with the scheduled pipeline's browser_profiles/ on a shared host),
+renews its job lease with a heartbeat while it works, and writes the
+extracted rows back into the queue. Jobs of a worker that dies are reclaimed
+by another worker once their lease runs out.
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import socket
+import tempfile
+import time
+
+from playwright.async_api import async_playwright
+
+import job_queue
+from bank_config import BASE_DIR, PlanWatcher
+from capture_engine import apply_combination, load_bank_page, open_bank_context
+from rate_extraction import extract_pdf
+from result_sink import ResultSink
+
+POLL_SECONDS = 2
+OUT_FILE = "all_cleaned_rates.csv"
+
+
+async def keep_alive(conn, job_id, worker_id, lease):
+    while True:
+        await asyncio.sleep(lease / 3)
+        if not job_queue.heartbeat(conn, job_id, worker_id, lease):
+            print(f"⚠️ Lost lease on job {job_id}")
+            return
+
+
+async def run_job(contexts, p, bank, job, profile_root):
+    """Capture and extract a single (bank, mode, points) combination."""
+    if bank.name not in contexts:
+        contexts[bank.name], _ = await open_bank_context(p, bank, profile_root)
+    try:
+        page = await contexts[bank.name].new_page()
+        try:
+            await load_bank_page(page, bank)
+            await apply_combination(page, bank, job["mode"], job["toggle_id"])
+            pdf = await page.pdf(format="A4", print_background=True)
+        finally:
+            await page.close()
+    except Exception:
+        # The browser may have crashed: start the bank's next job on a fresh context
+        context = contexts.pop(bank.name)
+        try:
+            await context.close()
+        except Exception:
+            pass
+        raise
+    return await asyncio.to_thread(extract_pdf, bank, job["mode"], job["point_label"], io.BytesIO(pdf))
+
+
+async def work(args):
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    conn = job_queue.connect(args.db)
+    plans = PlanWatcher()
+    contexts = {}
+    idle_since = time.monotonic()
+    print(f"👷 Worker {worker_id} polling {args.db}")
+
+    with tempfile.TemporaryDirectory(prefix="rebot-worker-") as profile_root:
+        async with async_playwright() as p:
+            while True:
+                job = job_queue.claim(conn, worker_id, args.lease)
+                if job is None:
+                    if args.exit_when_idle and time.monotonic() - idle_since > args.exit_when_idle:
+                        break
+                    await asyncio.sleep(POLL_SECONDS)
+                    continue
+
+                print(f"➡️ Job {job['id']}: {job['bank']} {job['mode']} {job['point_label']} "
+                      f"(attempt {job['attempts']})")
+                beat = asyncio.create_task(keep_alive(conn, job["id"], worker_id, args.lease))
+                try:
+                    bank = plans.current().bank(job["bank"])
+                    rows = await run_job(contexts, p, bank, job, profile_root)
+                except Exception as e:
+                    job_queue.fail(conn, job["id"], worker_id, e)
+                    print(f"❌ Job {job['id']} failed: {e}")
+                else:
+                    job_queue.complete(conn, job["id"], worker_id, rows)
+                    print(f"✅ Job {job['id']} done ({len(rows)} rows)")
+                finally:
+                    beat.cancel()
+                idle_since = time.monotonic()
+
+            for context in contexts.values():
+                await context.close()
+    print(f"👋 Worker {worker_id} idle, exiting")
+
+
+def coordinate(args):
+    conn = job_queue.connect(args.db)
+    banks = PlanWatcher().plan.banks
+    run_id = job_queue.enqueue_run(conn, banks)
+    started = time.monotonic()
+    print(f"📋 Run {run_id}: queued {sum(len(b.combinations) for b in banks)} jobs in {args.db}")
+
+    while True:
+        job_queue.reap_expired(conn)
+        status = job_queue.run_status(conn, run_id)
+        if not status.get("pending") and not status.get("running"):
+            break
+        print(f"⏳ {status}")
+        time.sleep(POLL_SECONDS * 5)
+
+    # Publish atomically, like the pipeline: readers never see a half-written snapshot
+    with ResultSink(out=args.out, run_id=f"queue-{run_id}") as sink:
+        sink.extend(job_queue.run_results(conn, run_id))
+        sink.publish()
+    for bank, mode, point_label, error in job_queue.run_failures(conn, run_id):
+        print(f"⚠️ {bank} {mode} {point_label} failed: {error}")
+    print(f"✅ Run {run_id} finished in {time.monotonic() - started:.0f}s, saved CSV to {args.out}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed capture over a shared SQLite queue.")
+    parser.add_argument("--db", default=job_queue.QUEUE_DB, help="queue database path")
+    sub = parser.add_subparsers(dest="role", required=True)
+
+    c = sub.add_parser("coordinator", help="queue a run and wait for it")
+    c.add_argument("--out", default=OUT_FILE)
+
+    w = sub.add_parser("worker", help="process jobs from the queue")
+    w.add_argument("--lease", type=float, default=job_queue.LEASE_SECONDS)
+    w.add_argument("--exit-when-idle", type=float, default=0,
+                   help="exit after this many idle seconds (0 = run forever)")
+    args = parser.parse_args()
+
+    os.chdir(BASE_DIR)
+    if args.role == "coordinator":
+        coordinate(args)
+    else:
+        asyncio.run(work(args))
+
+
+if __name__ == "__main__":
+    main()